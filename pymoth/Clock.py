@@ -5,16 +5,79 @@ import time
 
 class Clock(object):
 
-    def __init__(self, frame_rate=25):
-        self.t0 = 0
-        self.wait_time = 0
+    def __init__(self, frame_rate=25, drop_frames=False):
+        """
+        Schedules playback at a fixed frame rate by sleeping (not spinning) until each frame is due
+        :param frame_rate: float: target number of frames per second
+        :param drop_frames: bool: whether toc should ask for frames to be skipped when playback falls behind
+        """
         self.frame_rate = frame_rate
         self.delay = 1 / frame_rate
+        self.drop_frames = drop_frames
+        self.wait_time = 0
+        self.n_frames = 0
+        self.n_dropped = 0
+        self._start = None
+        self._deadline = None
 
     def toc(self):
-        self.wait_time = time.time() - self.t0              # Time passed since last toc
-        while self.wait_time < self.delay:                  # While wait time is less than delay
-            self.wait_time = time.time() - self.t0          # Time passed since last toc
-        self.t0 = time.time()                               # Set time of last toc to current time
+        """
+        Call once a frame has been shown: waits until the next frame is due, using a monotonic clock
+        If playback is behind and drop_frames is set, returns how many frames to skip to get back to real time
+        :return: int: the number of frames to skip
+        """
+        now = time.monotonic()
+        if self._deadline is None:
+            self._start = now
+            self._deadline = now
+        self.n_frames += 1
+        self._deadline += self.delay
+        self.wait_time = max(0, self._deadline - now)
+        skip = 0
+        if self.wait_time:
+            time.sleep(self.wait_time)
+        elif self.drop_frames:
+            skip = int((now - self._deadline) // self.delay)
+            self._deadline += skip * self.delay
+            self.n_dropped += skip
+        else:
+            self._deadline = now                                        # Fell behind, do not try to catch up
+        return skip
+
+    def tick(self):
+        """
+        Count a frame as shown without waiting for it to be due, to measure the achieved frame rate only
+        :return: None
+        """
+        if self._start is None:
+            self._start = time.monotonic()
+        self.n_frames += 1
+
+    def reset(self):
+        """
+        Restart scheduling and statistics from the next toc
+        :return: None
+        """
+        self.wait_time = 0
+        self.n_frames = 0
+        self.n_dropped = 0
+        self._start = None
+        self._deadline = None
 
+    def get_fps(self):
+        """
+        :return: float: the achieved number of frames shown per second since the first toc
+        """
+        if self._start is None:
+            return 0.0
+        elapsed = time.monotonic() - self._start
+        return self.n_frames / elapsed if elapsed > 0 else 0.0
 
+    def get_stats(self):
+        """
+        :return: dict: target and achieved frame rate, and the number of frames shown and dropped
+        """
+        return {"target_fps": self.frame_rate,
+                "fps": self.get_fps(),
+                "frames": self.n_frames,
+                "dropped": self.n_dropped}
@@ -1,14 +1,27 @@
 #!/usr/bin/env python3
 
 import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
 from pymoth import Sequence
 from pymoth import Namespace
+from pymoth import LazySequence
 
 
 class DataSet(Namespace):
 
-    def __init__(self, directory):
+    def __init__(self, directory, lazy=False, cache=True, workers=1, formats=None):
+        """
+        :param directory: str: path to the data set
+        :param lazy: bool: if True, each det / gt entry is a LazySequence which loads its labels on first access
+        :param cache: bool: whether to use the on-disk cache of parsed labels (see pymoth.cache)
+        :param workers: int: number of processes used to load sequences concurrently
+        :param formats: dict: label format of det and gt files (see pymoth.formats), MOT-det and MOT-gt by default
+        """
         Namespace.__init__(self)
+        formats = dict({"det": "MOT-det", "gt": "MOT-gt"}, **({} if formats is None else formats))
+        entries = []
         # For each sub directory (typically 'train' and 'test')
         for sub_dir in os.listdir(directory):
             # Add a new Namespace under the name of this sub directory
@@ -24,11 +37,43 @@ class DataSet(Namespace):
                 data_set = data_set.replace("-", "_")
                 # Add a new Namespace under the name of this data set
                 self.add({data_set: Namespace()}, sub_space=sub_dir)
-                # If det.txt is found, name a new Namespace under det and load the data for each frame
+                # If det.txt / gt.txt is found, a Sequence will be added under det / gt
                 if os.path.isfile(det_path):
-                    self.add({"det": Sequence()}, sub_space=[sub_dir, data_set])
-                    self.get(key=[sub_dir, data_set, "det"]).load_frames(img_dir, det_path, seq_path)
-                # If det.txt is found, name a new Namespace under gt and load the data for each frame
+                    entries.append(([sub_dir, data_set], "det", img_dir, det_path, seq_path))
                 if os.path.isfile(gt_path):
-                    self.add({"gt": Sequence()}, sub_space=[sub_dir, data_set])
-                    self.get(key=[sub_dir, data_set, "gt"]).load_frames(img_dir, gt_path, seq_path)
+                    entries.append(([sub_dir, data_set], "gt", img_dir, gt_path, seq_path))
+        # Load the data for each frame of each sequence
+        if lazy:
+            for sub_space, key, img_dir, label_path, seq_path in entries:
+                self.add({key: LazySequence(img_dir, label_path, seq_path, file_format=formats[key], cache=cache)},
+                         sub_space=sub_space)
+        elif workers > 1:
+            # Sequences are parsed in worker processes and only their label columns are sent back
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_load_labels, img_dir, label_path, seq_path, cache, formats[key])
+                           for _, key, img_dir, label_path, seq_path in entries]
+                for (sub_space, key, img_dir, _, seq_path), future in zip(entries, futures):
+                    sequence = Sequence(file_format=formats[key])
+                    sequence.init_frames(info_path=seq_path, img_dir=img_dir, cache=cache)
+                    sequence.set_data(future.result())
+                    self.add({key: sequence}, sub_space=sub_space)
+        else:
+            for sub_space, key, img_dir, label_path, seq_path in entries:
+                sequence = Sequence(file_format=formats[key])
+                sequence.load_frames(img_dir, label_path, seq_path, cache=cache)
+                self.add({key: sequence}, sub_space=sub_space)
+
+
+def _load_labels(img_dir, label_path, info_path, cache=True, file_format="MOT"):
+    """
+    Load a sequence in a worker process
+    :param img_dir: str: path to the directory of sequence images
+    :param label_path: str: path to the label file
+    :param info_path: str: path to the seqinfo.ini file
+    :param cache: bool: whether to use the on-disk cache of parsed labels
+    :param file_format: str: name of the label format
+    :return: dict: the label store columns of the sequence (in-memory arrays, cheap to send between processes)
+    """
+    sequence = Sequence(file_format=file_format)
+    sequence.load_frames(img_dir, label_path, info_path, cache=cache)
+    return {key: np.array(column) for key, column in sequence.store.get_data().items()}
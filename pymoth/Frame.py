@@ -3,39 +3,118 @@
 import cv2
 import numpy as np
 
+from pymoth import aio
+from pymoth import profiling
 from pymoth.Instance import Instance
-from pymoth.utils import resize
+from pymoth.LabelStore import LabelStore
+from pymoth.SpatialIndex import SpatialIndex
+from pymoth.utils import crop_batch
+from pymoth.utils import imread
 from pymoth.utils import box2xywh
 from pymoth.utils import box2rect
 
 
 class Frame(object):
 
-    def __init__(self, index=None, img_path=None):
+    def __init__(self, index=None, img_path=None, store=None):
+        """
+        :param index: int: the index of the frame in the sequence
+        :param img_path: str: the path to the image of the frame
+        :param store: LabelStore: the label store of the sequence (a stand-alone frame creates its own)
+        """
         self.index = index
         self.img_path = img_path
-        self.instances = []
+        if store is None:
+            self._store = LabelStore(n_frames=1)
+            self._slot = 0
+        else:
+            self._store = store
+            self._slot = index
+        self._instances = []                                            # Instance views materialised so far
+
+    @property
+    def instances(self):
+        """
+        Instance objects are only materialised (as views into the label store) when they are asked for
+        :return: list: Instance objects in the frame
+        """
+        n = self._store.get_count(self._slot)
+        if len(self._instances) < n:
+            self._instances.extend(Instance.views(self, len(self._instances), n))
+        return self._instances
+
+    def iter_instances(self, states=None):
+        """
+        Iterate over the instances without materialising them, e.g. to draw every frame of a long sequence
+        Instances already materialised are yielded as they are (with their state and color), the others as temporary
+        views that the frame does not keep
+        :param states: list: only yield instances in one of these states (all instances if None)
+        :return: generator of Instance objects
+        """
+        n = len(self._instances)
+        for index in range(self._store.get_count(self._slot)):
+            instance = self._instances[index] if index < n else Instance.view(self, index)
+            if states is None or instance.get_state() in states:
+                yield instance
+
+    def get_label(self, key, index=None):
+        """
+        :param key: str: name of a label store column
+        :param index: int: index of an instance within the frame (all instances if None)
+        :return: np.array: the column slice (a view) for this frame or a single value
+        """
+        column = self._store.get(key, self._slot)
+        return column if index is None else column[index]
+
+    def get_columns(self):
+        """
+        :return: dict: the label store columns (name -> (dtype, shape, fill value))
+        """
+        return self._store.columns
+
+    def set_label(self, key, value, index=None):
+        """
+        :param key: str: name of a label store column
+        :param value: the new value(s)
+        :param index: int: index of an instance within the frame (all instances if None)
+        :return: None
+        """
+        self._store.set(key, value, frame=self._slot, index=index)
 
     def create_instance(self, kwargs):
         """
         Create an instance and append the frame
+        Only the label store is written to unless kwargs hold data that the store does not
         :param kwargs:
         :return:
         """
-        kwargs["img_path"] = self.img_path
-        kwargs["frame_index"] = self.index
-        self.add_instance(Instance(**kwargs))
+        if set(kwargs) <= {"id_number", "bounding_box", "conf"}:
+            self._store.append(self._slot,
+                               id=kwargs.get("id_number"),
+                               box=kwargs.get("bounding_box"),
+                               conf=kwargs.get("conf"))
+        else:
+            kwargs["img_path"] = self.img_path
+            kwargs["frame_index"] = self.index
+            self.add_instance(Instance(**kwargs))
 
     def add_instance(self, instance):
         """
         Appends an instance to self.instances
+        The instance data is moved to the label store and the instance becomes a view of it
         :param instance: Instance: an instance object
         :return: None
         """
-        instance.img_path = self.img_path
-        instance.frame_index = self.index
-        self.instances.append(instance)
+        instances = self.instances
+        index = self._store.append(self._slot,
+                                   id=instance.get_id(),
+                                   box=instance.get_bounding_box(),
+                                   conf=instance.conf,
+                                   coordinates=instance.get_coordinates())
+        instance._bind(self, index)
+        instances.append(instance)
 
+    @profiling.timed("Frame.get_image")
     def get_image(self, width=1, scale=1, draw=False, show_ids=False, states=None):
         """
         :param width:
@@ -47,24 +126,31 @@ class Frame(object):
         """
         if self.img_path is None:
             raise ValueError("Frame image path not set")
-        image = cv2.imread(self.img_path)
-        if image is None:
-            raise FileNotFoundError("cv2.imread(%s) returned None, check %s" % (self.img_path, self.img_path))
-        if scale is not 1:
+        image = imread(self.img_path)
+        if scale != 1:
             image = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+        else:
+            image = image.copy()
         if draw:
-            for instance in self.get_instances(states=states):
+            for instance in self.iter_instances(states=states):
                 image = instance.show(image=image, draw=draw, width=width, scale=scale, show_ids=show_ids)
         return image
 
+    async def aget_image(self, width=1, scale=1, draw=False, show_ids=False, states=None):
+        """
+        Async counterpart of get_image, the image is decoded on the pymoth.aio executor
+        :return: np.array: the frame image
+        """
+        return await aio.run(self.get_image, width=width, scale=scale, draw=draw, show_ids=show_ids, states=states)
+
     def get_n_instances(self, id=None):
         """
         :return: int: the number of instances in the frame
         """
         if id is None:
-            return len(self.instances)
+            return self._store.get_count(self._slot)
         else:
-            return len([1 for instance in self.instances if instance.get_id() == id])
+            return int(np.count_nonzero(self.get_ids() == id))
 
     def get_instances(self, index=None, id=None, states=None):
         """
@@ -81,21 +167,21 @@ class Frame(object):
             return [instance for instance in self.instances if instance.get_state() in states]
         # Get instances with given id
         elif id is not None and states is None and index is None:
-            return [instance for instance in self.instances if instance.get_id() == id]
+            return [self.instances[i] for i in np.flatnonzero(self.get_ids() == id)]
         # Get instance with given index
         elif index is not None and states is None and id is None:
             return self.instances[index]
         # Get instance with given id and states
         elif id is not None and states is not None and index is None:
-            return [instance for instance in self.instances if instance.get_id() == id and instance.get_state() in states]
+            return [instance for instance in self.get_instances(id=id) if instance.get_state() in states]
         else:
             raise NotImplementedError("combination of kwargs is currently not supported")
 
     def get_ids(self):
         """
-        :return: list: id values for each instance in the frame
+        :return: np.array: id values for each instance in the frame
         """
-        return [instance.id for instance in self.instances]
+        return self.get_label("id")
 
     def get_n_ids(self):
         """
@@ -106,12 +192,11 @@ class Frame(object):
     def get_boxes(self, id=None):
         """
         :param id:
-        :return:
+        :return: np.array: bounding boxes (left, top, width, height) of the instances in the frame
         """
-        bounding_boxes = np.empty((self.get_n_instances(id=id), 4))
-        for i, instance in enumerate(self.get_instances(id=id)):
-            bounding_boxes[i] = instance.get_bounding_box()
-        return bounding_boxes
+        if id is None:
+            return self.get_label("box")
+        return self.get_label("box")[self.get_ids() == id]
 
     def get_xywh(self, id=None):
         """
@@ -127,27 +212,42 @@ class Frame(object):
         """
         return box2rect(self.get_boxes(id=id))
 
+    def get_spatial_index(self, id=None):
+        """
+        Build a SpatialIndex of the rects in the frame, e.g. to find instances in a region or overlapping instances
+        The index is a snapshot, it is not updated if the boxes of the frame change
+        :param id:
+        :return: SpatialIndex: index of the rects (indexes are instance indexes within the frame if id is None)
+        """
+        return SpatialIndex(self.get_rects(id=id))
+
     def get_conf(self):
         """
-        :return: list: confidence values for each instance in the frame
+        :return: np.array: confidence values for each instance in the frame
         """
-        return [instance.conf for instance in self.instances]
+        return self.get_label("conf")
 
-    def get_appearances(self, id=None, shape=None):
+    def get_appearances(self, id=None, shape=None, out=None):
         """
         :param id:
         :param shape:
+        :param out: np.array: array of shape (n_instances,) + shape to write the appearances into (if shape is given)
         :return:
         """
-        image = cv2.imread(self.img_path)
+        image = imread(self.img_path)
         rects = self.get_rects(id=id).astype(int)
         rects[rects < 0] = 0
         if shape is None:
             appearances = []
             for x0, y0, x1, y1 in rects:
-                appearances.append(image[y0:y1, x0:x1])
+                appearances.append(image[y0:y1, x0:x1].copy())
         else:
-            appearances = np.empty((tuple([self.get_n_instances(id=id)] + list(shape))), dtype=np.uint8)
-            for i, (x0, y0, x1, y1) in enumerate(rects):
-                appearances[i] = resize(image[y0:y1, x0:x1], shape)
+            appearances = crop_batch(image, rects, shape, out=out)
         return appearances
+
+    async def aget_appearances(self, id=None, shape=None):
+        """
+        Async counterpart of get_appearances, crops are extracted on the pymoth.aio executor
+        :return: np.array of crops if shape is given, else a list of crops
+        """
+        return await aio.run(self.get_appearances, id=id, shape=shape)
@@ -14,13 +14,19 @@ WARNING: Full functionality for the world coordinate system is not yet implement
 import cv2
 import numpy as np
 
+from pymoth import profiling
+from pymoth.utils import imread
 from pymoth.utils import resize
 from pymoth.utils import box2rect
 from pymoth.utils import box2xywh
+from pymoth.utils import id2color
 
 
 class Instance(object):
 
+    __slots__ = ("_frame", "_index", "_bounding_box", "_coordinates", "_id", "_conf", "_color", "_frame_index",
+                 "_img_path", "mode", "state")
+
     def __init__(self, id_number=-1,
                  img_path=None,
                  frame_index=None,
@@ -40,14 +46,16 @@ class Instance(object):
         :param color: tuple: the color used when drawing the instance bounding box
         """
         # Private variables
+        self._frame = None                  # Frame whose label store holds the instance data (None if stand-alone)
+        self._index = None                  # Index of the instance within self._frame
         self._bounding_box = None
         self._coordinates = None
         self._id = None
+        self._conf = conf
+        self._color = color
+        self._frame_index = frame_index
+        self._img_path = img_path
         # Public variables
-        self.color = color
-        self.conf = conf
-        self.frame_index = frame_index
-        self.img_path = img_path
         self.mode = None
         self.state = state
         # Set bounding_box / coordinates and id
@@ -57,12 +65,120 @@ class Instance(object):
             self.set_coordinates(coordinates)
         self.set_id(id_number)
 
+    @classmethod
+    def view(cls, frame, index):
+        """
+        Create an instance whose data is held by a frame's label store
+        :param frame: Frame: the frame that holds the instance
+        :param index: int: index of the instance within the frame
+        :return: Instance
+        """
+        instance = cls.__new__(cls)
+        instance._bounding_box = None
+        instance._coordinates = None
+        instance._id = None
+        instance._conf = None
+        instance._color = None
+        instance._frame_index = None
+        instance._img_path = None
+        instance.mode = "bounding_box"
+        instance.state = None
+        instance._bind(frame, index)
+        return instance
+
+    @classmethod
+    def views(cls, frame, start, stop):
+        """
+        Create the views of instances start to stop of a frame, as view does for a single instance but in one loop
+        :param frame: Frame: the frame that holds the instances
+        :param start: int: index of the first instance within the frame
+        :param stop: int: index after the last instance
+        :return: list: Instance objects
+        """
+        new = cls.__new__
+        instances = []
+        for index in range(start, stop):
+            instance = new(cls)
+            instance._frame = frame
+            instance._index = index
+            instance._bounding_box = None
+            instance._coordinates = None
+            instance._id = None
+            instance._conf = None
+            instance._color = None
+            instance._frame_index = None
+            instance._img_path = None
+            instance.mode = "bounding_box"
+            instance.state = None
+            instances.append(instance)
+        return instances
+
+    def _bind(self, frame, index):
+        """
+        Make the instance a view of row index of the given frame, the frame's label store now holds its data
+        :param frame: Frame: the frame that holds the instance
+        :param index: int: index of the instance within the frame
+        :return: None
+        """
+        self._frame = frame
+        self._index = index
+
+    @property
+    def id(self):
+        return self.get_id()
+
+    @property
+    def conf(self):
+        if self._frame is None:
+            return self._conf
+        return self._frame.get_label("conf", self._index)
+
+    @conf.setter
+    def conf(self, conf):
+        if self._frame is None:
+            self._conf = conf
+        else:
+            self._frame.set_label("conf", conf, self._index)
+
+    @property
+    def frame_index(self):
+        if self._frame is None:
+            return self._frame_index
+        return self._frame.index
+
+    @frame_index.setter
+    def frame_index(self, frame_index):
+        self._frame_index = frame_index
+
+    @property
+    def img_path(self):
+        if self._frame is None:
+            return self._img_path
+        return self._frame.img_path
+
+    @img_path.setter
+    def img_path(self, img_path):
+        self._img_path = img_path
+
+    @property
+    def color(self):
+        if self._color is not None:
+            return self._color
+        return id2color(int(self.get_id()))
+
+    @color.setter
+    def color(self, color):
+        self._color = color
+
     def set_bounding_box(self, bounding_box):
         """
         Cast coordinates as np.array and set mode
         :return: None
         """
-        self._bounding_box = np.asarray(bounding_box)
+        if self._frame is None:
+            self._bounding_box = np.asarray(bounding_box)
+        else:
+            self._frame.set_label("box", bounding_box, self._index)
         self.mode = "bounding_box"
 
     def set_coordinates(self, coordinates):
@@ -70,34 +186,45 @@ class Instance(object):
         Cast coordinates as np.array and set mode
         :return: None
         """
-        self._coordinates = np.asarray(coordinates)
+        if self._frame is not None and "coordinates" in self._frame.get_columns():
+            self._frame.set_label("coordinates", coordinates, self._index)
+        else:
+            self._coordinates = np.asarray(coordinates)
         self.mode = "world_coordinates"
 
+    def get_coordinates(self):
+        """
+        :return: np.array(1, 3): the instance world coordinates (x, y, z), None if not set
+        """
+        if self._frame is not None and "coordinates" in self._frame.get_columns():
+            return self._frame.get_label("coordinates", self._index)
+        return self._coordinates
+
     def set_id(self, id_number):
         """
         Sets the instance id
-        If the instnace color is not already set, sets the instance color based on the instance id number
+        If the instance color is not set, the instance color is derived from the instance id number
         :param id_number: int: the unique identification number of the instance
         :return: None
         """
-        self._id = id_number
-        if self._id == -1:
-            self.color = (255, 255, 255)
+        if self._frame is None:
+            self._id = id_number
         else:
-            np.random.seed(id_number)
-            self.color = tuple(map(int, np.random.randint(0, 255, 3)))
+            self._frame.set_label("id", id_number, self._index)
 
     def get_bounding_box(self):
         """
         :return: np.array(1, 4): the instance bounding box (left, top, width, height)
         """
-        return self._bounding_box
+        if self._frame is None:
+            return self._bounding_box
+        return self._frame.get_label("box", self._index)
 
     def get_rect(self):
         """
         :return: np.array(1, 4): the instance rect (left, top, right, bottom)
         """
-        return box2rect(self._bounding_box)
+        return box2rect(self.get_bounding_box())
 
     def get_state(self):
         """
@@ -109,13 +236,15 @@ class Instance(object):
         """
         :return: np.array(1, 4): the bounding box defined by (left, top, width, height)
         """
-        return box2xywh(self._bounding_box)
+        return box2xywh(self.get_bounding_box())
 
     def get_id(self):
         """
         :return: int: the unique identification number of the instance
         """
-        return self._id
+        if self._frame is None:
+            return self._id
+        return self._frame.get_label("id", self._index)
 
     def get_appearance(self, shape=None, keep_aspect=True):
         """
@@ -124,19 +253,20 @@ class Instance(object):
         :return: np.array: the image of the instance
         """
         if self.mode == "bounding_box":
-            rect = self.get_rect()
+            rect = self.get_rect().astype(int)
             rect[rect < 0] = 0
             x0, y0, x1, y1 = rect
             if shape is None:
-                return cv2.imread(self.img_path)[y0:y1, x0:x1]
+                return imread(self.img_path)[y0:y1, x0:x1].copy()
             else:
                 if keep_aspect:
-                    return resize(cv2.imread(self.img_path)[y0:y1, x0:x1], shape)
+                    return resize(imread(self.img_path)[y0:y1, x0:x1], shape)
                 else:
-                    return cv2.resize(cv2.imread(self.img_path)[y0:y1, x0:x1], shape[0: 2])
+                    return cv2.resize(imread(self.img_path)[y0:y1, x0:x1], shape[0: 2])
         else:
             raise NotImplementedError("Get appearance not yet implemented for world_coordinates mode")
 
+    @profiling.timed("Instance.show")
     def show(self, image=None, draw=False, width=1, scale=1, show_ids=False):
         """
         :param image: np.array: the image on which to draw the instance
@@ -147,14 +277,14 @@ class Instance(object):
         :return: np.array: the original image with the instance drawn
         """
         if image is None:
-            image = cv2.imread(self.img_path)
+            image = imread(self.img_path).copy()
         if draw:
             if self.mode == "bounding_box":
                 rect = self.get_rect() * scale
                 x1, y1, x2, y2 = rect.astype(int)
                 image = cv2.rectangle(image, pt1=(x1, y1), pt2=(x2, y2), color=self.color, thickness=width)
                 if show_ids and self.get_id() != -1:
-                    image = cv2.putText(image, "%s" % self._id, (x1, y1), cv2.FONT_HERSHEY_SIMPLEX, 2 * scale, self.color, thickness=width)
+                    image = cv2.putText(image, "%s" % self.get_id(), (x1, y1), cv2.FONT_HERSHEY_SIMPLEX, 2 * scale, self.color, thickness=width)
                 return image
             elif self.mode == "world_coordinates":
                 raise NotImplementedError("Instance.draw() is not yet implemented for 'world_coordinates'")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+"""
+A LabelFollower keeps a Sequence up to date with a label file that is still being written (e.g. by an online tracker).
+Only the bytes appended since the last poll are read, complete lines are parsed in batches, frames are added to the
+sequence as needed and subscribers are told which frames received new instances.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class LabelFollower(object):
+
+    def __init__(self, sequence, label_path, poll_interval=0.5, chunk_bytes=2 ** 20, img_dir=None, img_ext=".jpg"):
+        """
+        :param sequence: Sequence: the sequence to add instances to (it may have no frames yet)
+        :param label_path: str: path to the label file being written
+        :param poll_interval: float: seconds to wait between polls when no new lines were found
+        :param chunk_bytes: int: maximum number of bytes read and parsed in one batch
+        :param img_dir: str: directory of frame images, named <frame number:06d><img_ext> (no image paths if None)
+        :param img_ext: str: extension of frame images
+        """
+        self.sequence = sequence
+        self.label_path = label_path
+        self.poll_interval = poll_interval
+        self.chunk_bytes = chunk_bytes
+        self.img_dir = img_dir
+        self.img_ext = img_ext
+        self.offset = 0                                                 # Bytes of the file read so far
+        self.lock = threading.Lock()                                    # Held while the sequence is updated
+        self._partial = b""                                             # Read bytes of an incomplete last line
+        self._subscribers = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    def subscribe(self, callback):
+        """
+        :param callback: function: called as callback(sequence, frames) after each batch, frames being the
+        (sorted, unique) indexes of the frames that received new instances
+        :return: function: the callback
+        """
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        """
+        :param callback: function: a subscribed callback
+        :return: None
+        """
+        self._subscribers.remove(callback)
+
+    def poll(self, final=False):
+        """
+        Read and add every complete line appended to the file since the last poll
+        :param final: bool: also parse a last line that is not terminated by a newline (e.g. when the writer is done)
+        :return: int: the number of instances added
+        """
+        if not os.path.exists(self.label_path):
+            return 0
+        if os.path.getsize(self.label_path) < self.offset:
+            raise IOError("%s was truncated while being followed" % self.label_path)
+        n = 0
+        with open(self.label_path, "rb") as file:
+            file.seek(self.offset)
+            while True:
+                chunk = file.read(self.chunk_bytes)
+                if not chunk:
+                    break
+                self.offset += len(chunk)
+                data = self._partial + chunk
+                end = data.rfind(b"\n") + 1
+                self._partial = data[end:]
+                n += self._add(data[:end])
+        if final and self._partial.strip():
+            n += self._add(self._partial)
+            self._partial = b""
+        return n
+
+    def follow(self, timeout=None):
+        """
+        Poll the file until stop is called or no line has been added for timeout seconds
+        :param timeout: float: seconds without new lines after which to return (never if None)
+        :return: None
+        """
+        last = time.monotonic()
+        while not self._stop.is_set():
+            if self.poll():
+                last = time.monotonic()
+            elif timeout is not None and time.monotonic() - last >= timeout:
+                break
+            self._stop.wait(self.poll_interval)
+        self.poll(final=True)
+
+    def start(self, timeout=None):
+        """
+        Follow the file on a background thread, subscribers are called from that thread
+        :param timeout: float: seconds without new lines after which to stop (never if None)
+        :return: None
+        """
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.follow, args=(timeout,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop following the file and wait for the background thread to finish
+        :return: None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def is_running(self):
+        """
+        :return: bool: whether the file is being followed on a background thread
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def _add(self, data):
+        """
+        :param data: bytes: complete label lines
+        :return: int: the number of instances added
+        """
+        lines = [line for line in data.decode().splitlines() if line.strip()]
+        if not lines:
+            return 0
+        labels = self.sequence.label_format.parse(lines)
+        with self.lock:
+            n_frames = self.sequence.get_n_frames()
+            frames = self.sequence.add_labels(labels)
+            if self.img_dir is not None:
+                for i in range(n_frames, self.sequence.get_n_frames()):
+                    self.sequence.set_frame_path(i, os.path.join(self.img_dir, "%06d%s" % (i + 1, self.img_ext)))
+        frames = np.unique(frames)
+        for callback in list(self._subscribers):
+            callback(self.sequence, frames)
+        return len(lines)
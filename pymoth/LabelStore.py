@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+
+"""
+A LabelStore holds the labels of every instance in a Sequence as contiguous columns (struct of arrays).
+Rows are sorted by frame, the rows of frame f being rows offsets[f]:offsets[f + 1] of each column.
+Frame and Instance objects do not hold label data themselves, they are views into a LabelStore.
+"""
+
+import numpy as np
+
+
+class LabelStore(object):
+
+    # Number of single-row id changes held on top of the id index before it is rebuilt
+    max_id_changes = 4096
+
+    # Number of rows appended after the id index was built that are scanned before they are merged into it
+    max_id_appended = 4096
+
+    # Label columns: name -> (dtype, shape of a single row, value used when a label is not given)
+    columns = {"id": (np.int64, (), -1),
+               "box": (np.float64, (4,), np.nan),
+               "conf": (np.float64, (), -1)}
+
+    def __init__(self, n_frames=0, columns=None):
+        """
+        :param n_frames: int: the number of frames to allocate
+        :param columns: dict: label columns (as in LabelStore.columns) to hold in addition to / instead of the defaults
+        """
+        if columns is not None:
+            self.columns = dict(LabelStore.columns, **columns)
+        self.offsets = np.zeros(n_frames + 1, dtype=np.int64)
+        self._data = {"frame": np.empty(0, dtype=np.int64)}
+        for key, (dtype, shape, _) in self.columns.items():
+            self._data[key] = np.empty((0,) + shape, dtype=dtype)
+        self._buffers = dict(self._data)                                # Columns with spare capacity, _data are views
+        self._counts = np.zeros(n_frames, dtype=np.int64)
+        self._pending = []                                              # Blocks of rows not yet merged
+        self._rows = {key: [] for key in self._data}                    # Single rows not yet merged
+        self._id_index = None                                           # (ids, starts, rows sorted by id)
+        self._id_changes = {}                                           # Row -> id, changed since the index was built
+        self._n_indexed = 0                                             # Rows covered by the id index
+
+    def __len__(self):
+        return int(self._counts.sum())
+
+    def add_frames(self, n=1):
+        """
+        Allocate n (empty) frames at the end of the store
+        :param n: int: the number of frames to add
+        :return: None
+        """
+        self._counts = np.concatenate((self._counts, np.zeros(n, dtype=np.int64)))
+        self.offsets = np.concatenate((self.offsets, np.full(n, self.offsets[-1], dtype=np.int64)))
+
+    def get_n_frames(self):
+        """
+        :return: int: the number of frames allocated in the store
+        """
+        return len(self._counts)
+
+    def get_count(self, frame=None):
+        """
+        :param frame: int: index of a frame
+        :return: int: the number of rows in the frame (or in the store if frame is None)
+        """
+        if frame is None:
+            return len(self)
+        return int(self._counts[frame])
+
+    def get_counts(self):
+        """
+        :return: np.array: the number of rows in each frame
+        """
+        return self._counts
+
+    def get_offsets(self):
+        """
+        :return: np.array: per-frame offsets, rows of frame f are rows offsets[f]:offsets[f + 1]
+        """
+        self.compact()
+        return self.offsets
+
+    def append(self, frame, **labels):
+        """
+        Append a single row to a frame
+        Rows are buffered and merged into the columns on the next read, so appending is O(1)
+        :param frame: int: index of the frame
+        :param labels: value for each column (missing columns are filled with their default)
+        :return: int: the index of the new row within the frame
+        """
+        if not 0 <= frame < self.get_n_frames():
+            raise IndexError("Frame %i out of range for LabelStore with %i frames" % (frame, self.get_n_frames()))
+        index = int(self._counts[frame])
+        self._counts[frame] += 1
+        self._rows["frame"].append(frame)
+        for key, (dtype, shape, fill) in self.columns.items():
+            value = labels.get(key)
+            self._rows[key].append(np.full(shape, fill, dtype=dtype) if value is None else value)
+        return index
+
+    def extend(self, frame, **labels):
+        """
+        Append a block of rows in a single call
+        :param frame: np.array: frame index of each row
+        :param labels: np.array for each column (missing columns are filled with their default)
+        :return: None
+        """
+        frame = np.asarray(frame, dtype=np.int64).reshape(-1)
+        if frame.size and (frame.min() < 0 or frame.max() >= self.get_n_frames()):
+            raise IndexError("Frame indexes must be within [0, %i)" % self.get_n_frames())
+        self._flush_rows()
+        block = {"frame": frame}
+        for key, (dtype, shape, fill) in self.columns.items():
+            if labels.get(key) is None:
+                block[key] = np.full((len(frame),) + shape, fill, dtype=dtype)
+            else:
+                block[key] = np.asarray(labels[key], dtype=dtype).reshape((len(frame),) + shape)
+        self._pending.append(block)
+        self._counts += np.bincount(frame, minlength=self.get_n_frames())
+
+    def compact(self):
+        """
+        Merge any buffered rows into the columns, keeping rows sorted by frame
+        Rows of the same frame keep the order in which they were added
+        Rows added at or after the last stored frame (e.g. by an online tracker) are copied to the end of the columns,
+        which grow with amortised capacity, only rows added to earlier frames make the whole store be re-sorted
+        :return: None
+        """
+        self._flush_rows()
+        if not self._pending:
+            return
+        blocks = self._pending
+        self._pending = []
+        new = {key: np.concatenate([block[key] for block in blocks]) for key in self._data}
+        frame = new["frame"]
+        if frame.size and np.any(frame[1:] < frame[:-1]):
+            order = np.argsort(frame, kind="stable")
+            new = {key: column[order] for key, column in new.items()}
+        n = len(self._data["frame"])
+        if not n or not frame.size or new["frame"][0] >= self._data["frame"][-1]:
+            self._append_rows(new)                                      # Rows keep their indexes, the id index holds
+        else:
+            data = {key: np.concatenate((self._data[key], new[key])) for key in self._data}
+            order = np.argsort(data["frame"], kind="stable")
+            self._data = {key: column[order] for key, column in data.items()}
+            self._buffers = dict(self._data)
+            self._id_index = None
+        self.offsets = np.zeros(self.get_n_frames() + 1, dtype=np.int64)
+        np.cumsum(self._counts, out=self.offsets[1:])
+
+    def get_data(self):
+        """
+        :return: dict: every column, including 'frame', sorted by frame
+        """
+        self.compact()
+        return dict(self._data)
+
+    def set_data(self, data):
+        """
+        Replace every row of the store with columns that are already sorted by frame (e.g. from get_data)
+        The arrays are used as they are, without copying
+        :param data: dict: column name -> np.array, including 'frame'
+        :return: None
+        """
+        frame = data["frame"]
+        if frame.size and (frame[0] < 0 or frame[-1] >= self.get_n_frames()):
+            raise IndexError("Frame indexes must be within [0, %i)" % self.get_n_frames())
+        self._pending = []
+        self._rows = {key: [] for key in self._data}
+        self._data = {key: data[key] for key in self._data}
+        self._buffers = dict(self._data)
+        self._id_index = None
+        self._counts = np.bincount(frame, minlength=self.get_n_frames()).astype(np.int64)
+        self.offsets = np.zeros(self.get_n_frames() + 1, dtype=np.int64)
+        np.cumsum(self._counts, out=self.offsets[1:])
+
+    def get(self, key, frame=None):
+        """
+        :param key: str: name of the column ('frame' or one of LabelStore.columns)
+        :param frame: int: index of a frame (all rows if None)
+        :return: np.array: the column (a view, not a copy)
+        """
+        self.compact()
+        if frame is None:
+            return self._data[key]
+        return self._data[key][self.offsets[frame]:self.offsets[frame + 1]]
+
+    def set(self, key, value, frame=None, index=None):
+        """
+        Write to a column, in place
+        Writes to the id column should go through set or set_rows so that the id index stays up to date
+        :param key: str: name of the column
+        :param value: new value(s)
+        :param frame: int: index of a frame (all rows if None)
+        :param index: int: index of the row within the frame (all rows of the frame if None)
+        :return: None
+        """
+        if frame is None:
+            self.get(key)[...] = value
+        elif index is None:
+            self.get(key, frame)[...] = value
+        else:
+            self.compact()
+            row = self.offsets[frame] + index
+            self._data[key][row] = value
+            if key == "id" and self._id_index is not None:
+                self._id_changes[int(row)] = int(value)
+                if len(self._id_changes) > self.max_id_changes:
+                    self._id_index = None
+            return
+        if key == "id":
+            self._id_index = None
+
+    def set_rows(self, key, rows, value):
+        """
+        Write to rows of a column, in place
+        :param key: str: name of the column
+        :param rows: np.array: global row indexes (e.g. from get_id_rows)
+        :param value: new value(s)
+        :return: None
+        """
+        self.get(key)[rows] = value
+        if key == "id":
+            self._id_index = None
+
+    def get_id_rows(self, id):
+        """
+        Rows with the given id, from an index of rows by id (built on first use, rebuilt after bulk changes)
+        Rows appended since the index was built are scanned, then merged into the index once there are max_id_appended
+        :param id: int: an instance id
+        :return: np.array: sorted global row indexes of the instances with this id
+        """
+        self.compact()
+        if self._id_index is None:
+            self.build_id_index()
+        elif len(self._data["id"]) - self._n_indexed > self.max_id_appended:
+            self._merge_id_index()
+        ids, starts, order = self._id_index
+        i = np.searchsorted(ids, id)
+        if i < len(ids) and ids[i] == id:
+            rows = order[starts[i]:starts[i + 1]]
+        else:
+            rows = np.empty(0, dtype=np.int64)
+        appended = np.flatnonzero(self._data["id"][self._n_indexed:] == id) + self._n_indexed
+        if self._id_changes:
+            changed = np.fromiter(self._id_changes.keys(), dtype=np.int64, count=len(self._id_changes))
+            values = np.fromiter(self._id_changes.values(), dtype=np.int64, count=len(self._id_changes))
+            rows = np.unique(np.concatenate((rows[~np.isin(rows, changed)], changed[values == id], appended)))
+        elif appended.size:
+            rows = np.concatenate((rows, appended))
+        return rows
+
+    def build_id_index(self):
+        """
+        Sort rows by id so that the rows of any id are found in O(log(n_ids) + track length)
+        :return: None
+        """
+        ids = self.get("id")
+        order = np.argsort(ids, kind="stable")
+        self._id_index = self._make_id_index(ids[order], order)
+        self._id_changes = {}
+        self._n_indexed = len(ids)
+
+    def _merge_id_index(self):
+        """
+        Merge the rows appended since the id index was built into it, in O(n) rather than re-sorting every row
+        :return: None
+        """
+        ids, starts, order = self._id_index
+        new_ids = self._data["id"][self._n_indexed:]
+        new_order = np.argsort(new_ids, kind="stable")
+        sorted_ids = np.repeat(ids, np.diff(starts))
+        # Appended rows come after every indexed row, so they go after the indexed rows with the same id
+        positions = np.searchsorted(sorted_ids, new_ids[new_order], side="right")
+        sorted_ids = np.insert(sorted_ids, positions, new_ids[new_order])
+        order = np.insert(order, positions, new_order + self._n_indexed)
+        self._id_index = self._make_id_index(sorted_ids, order)
+        self._n_indexed = len(self._data["id"])
+
+    @staticmethod
+    def _make_id_index(sorted_ids, order):
+        """
+        :param sorted_ids: np.array: id of each row, sorted
+        :param order: np.array: rows in the order of sorted_ids
+        :return: (np.array, np.array, np.array): unique ids, start of the rows of each id in order (and the end), order
+        """
+        starts = np.flatnonzero(np.concatenate(([True], sorted_ids[1:] != sorted_ids[:-1]))) if sorted_ids.size \
+            else np.empty(0, dtype=np.int64)
+        return sorted_ids[starts], np.append(starts, len(sorted_ids)), order
+
+    def _append_rows(self, rows):
+        """
+        Copy rows to the end of the columns, reallocating them with twice the capacity when they are full
+        :param rows: dict: column name -> np.array, sorted by frame
+        :return: None
+        """
+        n, k = len(self._data["frame"]), len(rows["frame"])
+        if not k:
+            return
+        if n + k > len(self._buffers["frame"]):
+            capacity = max(n + k, 2 * len(self._buffers["frame"]), 64)
+            for key, column in self._data.items():
+                buffer = np.empty((capacity,) + column.shape[1:], dtype=column.dtype)
+                buffer[:n] = column
+                self._buffers[key] = buffer
+        for key, buffer in self._buffers.items():
+            buffer[n:n + k] = rows[key]
+            self._data[key] = buffer[:n + k]
+
+    def _flush_rows(self):
+        """
+        Move single appended rows into a pending block
+        :return: None
+        """
+        if not self._rows["frame"]:
+            return
+        block = {"frame": np.asarray(self._rows["frame"], dtype=np.int64)}
+        for key, (dtype, shape, _) in self.columns.items():
+            block[key] = np.asarray(self._rows[key], dtype=dtype).reshape((-1,) + shape)
+        self._pending.append(block)
+        self._rows = {key: [] for key in self._data}
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""
+A LazySequence stands in for a Sequence whose labels have not been loaded yet.
+The label file is parsed on first attribute access, and the loaded Sequence can be released again.
+"""
+
+import threading
+
+from pymoth.Sequence import Sequence
+
+
+class LazySequence(object):
+
+    def __init__(self, img_dir, label_path, info_path, file_format="MOT", cache=True):
+        """
+        :param img_dir: str: path to the directory of sequence images
+        :param label_path: str: path to the label file (e.g. det.txt or gt.txt)
+        :param info_path: str: path to the seqinfo.ini file
+        :param file_format: str: name of the label file format (see pymoth.formats)
+        :param cache: bool: whether to use the on-disk cache of parsed labels (see pymoth.cache)
+        """
+        self.img_dir = img_dir
+        self.label_path = label_path
+        self.info_path = info_path
+        self.file_format = file_format
+        self.cache = cache
+        self._sequence = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, item):
+        # Only called for attributes not found on the proxy itself, i.e. those of the Sequence
+        if item.startswith("__"):
+            raise AttributeError(item)
+        return getattr(self.load(), item)
+
+    def __repr__(self):
+        return "LazySequence(%s, loaded=%s)" % (self.label_path, self.is_loaded())
+
+    def load(self):
+        """
+        Load the sequence if it is not already loaded
+        :return: Sequence: the loaded sequence
+        """
+        with self._lock:
+            if self._sequence is None:
+                sequence = Sequence(file_format=self.file_format)
+                sequence.load_frames(self.img_dir, self.label_path, self.info_path, cache=self.cache)
+                self._sequence = sequence
+            return self._sequence
+
+    def release(self):
+        """
+        Drop the loaded sequence, it will be loaded again on next access
+        :return: None
+        """
+        with self._lock:
+            self._sequence = None
+
+    def is_loaded(self):
+        """
+        :return: bool: whether the sequence is currently loaded
+        """
+        return self._sequence is not None
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+"""
+A PatchStore is a directory of fixed-shape appearance patches (crops) in a memory-mapped .npy file,
+with an index giving the sequence, frame, id, bounding box and confidence of each patch.
+Patches are written once with PatchStore.export and then served to training jobs without decoding any images.
+"""
+
+import os
+import numpy as np
+
+from pymoth.Namespace import Namespace
+from pymoth.utils import extract_crops
+
+
+class PatchStore(object):
+
+    # Index columns stored alongside the patches
+    index_keys = ("sequence", "frame", "id", "box", "conf")
+
+    def __init__(self, directory):
+        """
+        Open a patch store for reading
+        :param directory: str: path to a directory written by PatchStore.export
+        """
+        self.directory = directory
+        self.patches = np.load(os.path.join(directory, "patches.npy"), mmap_mode="r")
+        self.index = {key: np.load(os.path.join(directory, "%s.npy" % key), mmap_mode="r") for key in self.index_keys}
+        self.sequences = np.load(os.path.join(directory, "sequences.npy")).tolist()
+
+    def __len__(self):
+        return len(self.patches)
+
+    def get_shape(self):
+        """
+        :return: tuple: the shape of a single patch
+        """
+        return self.patches.shape[1:]
+
+    def get_slice(self, start, stop):
+        """
+        :param start: int: index of the first patch
+        :param stop: int: index after the last patch
+        :return: np.array: the patches (a read-only view of the memory map, not a copy)
+        """
+        return self.patches[start:stop]
+
+    def get_batch(self, indexes, out=None):
+        """
+        Gather patches into a batch
+        :param indexes: np.array: indexes of the patches
+        :param out: np.array: array of shape (len(indexes),) + patch shape to write the batch into (allocated if None)
+        :return: np.array: the batch of patches
+        """
+        indexes = np.asarray(indexes, dtype=np.int64)
+        return np.take(self.patches, indexes, axis=0, out=out)
+
+    def get_index(self, key, indexes=None):
+        """
+        :param key: str: one of 'sequence', 'frame', 'id', 'box' or 'conf'
+        :param indexes: np.array: indexes of the patches (all patches if None)
+        :return: np.array: the index column for the patches
+        """
+        if indexes is None:
+            return self.index[key]
+        return self.index[key][np.asarray(indexes, dtype=np.int64)]
+
+    def sample(self, batch_size, rng=None, out=None):
+        """
+        Draw a random batch of patches
+        Indexes are sorted so the batch is read from the memory map in file order
+        :param batch_size: int: number of patches
+        :param rng: np.random.Generator: random number generator (a new one if None)
+        :param out: np.array: array to write the batch into (allocated if None)
+        :return: (np.array, np.array): the indexes of the patches and the patches
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        indexes = np.sort(rng.choice(len(self), size=batch_size, replace=batch_size > len(self)))
+        return indexes, self.get_batch(indexes, out=out)
+
+    @staticmethod
+    def export(directory, source, shape, key="gt", chunk_size=256, workers=4):
+        """
+        Write the appearance patch of every instance of a Sequence or DataSet to a new patch store
+        Patches are resized straight into the memory-mapped file, chunk_size frames at a time
+        :param directory: str: path to the directory to write
+        :param source: Sequence or DataSet
+        :param shape: tuple: the shape of each patch, e.g. (128, 64, 3)
+        :param key: str: which sequence of each DataSet entry to export ('det' or 'gt')
+        :param chunk_size: int: number of frames cropped per call to extract_crops
+        :param workers: int: number of threads used to decode frames and crop patches
+        :return: PatchStore: the new patch store, opened for reading
+        """
+        found = _find_sequences(source, key) if isinstance(source, Namespace) else [("sequence", source)]
+        names = [name for name, _ in found]
+        sequences = [sequence for _, sequence in found]
+        os.makedirs(directory, exist_ok=True)
+        n = sum(sequence.get_n_instances() for sequence in sequences)
+        patches = np.lib.format.open_memmap(os.path.join(directory, "patches.npy"), mode="w+",
+                                            dtype=np.uint8, shape=(n,) + tuple(shape))
+        index = {"sequence": [np.empty(0, dtype=np.int64)],
+                 "frame": [np.empty(0, dtype=np.int64)],
+                 "id": [np.empty(0, dtype=np.int64)],
+                 "box": [np.empty((0, 4))],
+                 "conf": [np.empty(0)]}
+        i = 0
+        for s, sequence in enumerate(sequences):
+            offsets = sequence.store.get_offsets()
+            frames = sequence.store.get("frame")
+            rects = sequence.get_rects()
+            img_paths = sequence.get_img_paths()
+            for f0 in range(0, sequence.get_n_frames(), chunk_size):
+                r0, r1 = offsets[f0], offsets[min(f0 + chunk_size, sequence.get_n_frames())]
+                extract_crops(img_paths, frames[r0:r1], rects[r0:r1], shape=shape,
+                              out=patches[i + r0:i + r1], workers=workers)
+            index["sequence"].append(np.full(len(frames), s, dtype=np.int64))
+            index["frame"].append(frames)
+            index["id"].append(sequence.get_ids())
+            index["box"].append(sequence.get_boxes())
+            index["conf"].append(sequence.get_conf())
+            i += len(frames)
+        patches.flush()
+        del patches
+        for name, columns in index.items():
+            np.save(os.path.join(directory, "%s.npy" % name), np.concatenate(columns))
+        np.save(os.path.join(directory, "sequences.npy"), np.array(names, dtype=str))
+        return PatchStore(directory)
+
+
+def _find_sequences(data_set, key):
+    """
+    :param data_set: DataSet: a data set (Namespace of sub directories and data sets)
+    :param key: str: 'det' or 'gt'
+    :return: list: (name, sequence) of each sequence stored under key, named <sub_dir>/<data_set>
+    """
+    found = []
+    for sub_dir, data_sets in data_set.get().items():
+        for name, entry in data_sets.get().items():
+            if key in entry.get():
+                found.append(("%s/%s" % (sub_dir, name), entry.get(key)))
+    return found
@@ -6,104 +6,346 @@ A Sequence object contains a list of frames, each frame has a list of instances
 
 import os
 import cv2
+import asyncio
 import copy
+import gc
+import collections
+import itertools
 import numpy as np
-from itertools import count
+from concurrent.futures import ThreadPoolExecutor
 
+from pymoth import aio
+from pymoth import cache as cache_module
+from pymoth import profiling
 from pymoth.Clock import Clock
 from pymoth.Frame import Frame
-from pymoth.utils import Progbar
+from pymoth.LabelFollower import LabelFollower
+from pymoth.LabelStore import LabelStore
+from pymoth.formats import get_format
 
 from pymoth.utils import box2rect
 from pymoth.utils import box2xywh
-from pymoth.utils import convert
-from pymoth.utils import iou2
+from pymoth.utils import extract_crops
+from pymoth.utils import imread
+from pymoth.utils import batch_iou2
 from pymoth.utils import load_info
-from pymoth.utils import nms
+from pymoth.utils import match
 
 
 class Sequence(object):
 
     def __init__(self, file_format="MOT"):
-        if file_format == "MOT":
-            from pymoth.formats import mot_format as file_format
-        else:
-            raise ValueError("unknown file format %s" % file_format)
-        self.file_format = file_format
+        """
+        :param file_format: str: name of a registered label format (see pymoth.formats), or a LabelFormat
+        """
+        self.label_format = get_format(file_format)
+        self.file_format = self.label_format.get_indexes()
+        self.file_dtypes = self.label_format.get_dtypes()
         self.info = None
         self.img_dir = None
+        self.store = LabelStore(columns=self.label_format.get_store_columns())
         self.frames = []
 
-    def set_ids(self, gt):
-        for det_frame, gt_frame in zip(self.get_frames(), gt.get_frames()):
-            mat = iou2(gt_frame.get_rects(), det_frame.get_rects())
+    def set_ids(self, gt, threshold=0.5, method="hungarian"):
+        """
+        Give each instance the id of the gt instance it is matched to (unmatched instances keep their id)
+        :param gt: Sequence: the ground truth sequence
+        :param threshold: float: minimum iou between matched instances
+        :param method: str: 'hungarian' (maximum total iou) or 'greedy' (highest iou first)
+        :return: None
+        """
+        rows, gt_rows = self.match(gt, threshold=threshold, method=method)
+        self.store.set_rows("id", rows, gt.store.get("id")[gt_rows])
+
+    def match(self, other, threshold=0.5, method="hungarian"):
+        """
+        Match the instances of this sequence to those of another, frame by frame, by iou
+        :param other: Sequence: the sequence to match against (e.g. ground truth)
+        :param threshold: float: minimum iou between matched instances
+        :param method: str: 'hungarian' (maximum total iou) or 'greedy' (highest iou first)
+        :return: (np.array, np.array): label store rows of matched instances in self and the matching rows in other
+        """
+        offsets = self.store.get_offsets()
+        other_offsets = other.store.get_offsets()
+        mats = batch_iou2(self.get_rects(), offsets, other.get_rects(), other_offsets, sparse=True)
+        rows, other_rows = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        for frame, mat in enumerate(mats):
             if mat.any():
-                mat = nms(mat, threshold=0.5)
-                for gt_index, det_index in np.argwhere(mat):
-                    gt_instance = gt_frame.get_instances(index=gt_index)
-                    det_frame.get_instances(index=det_index).set_id(gt_instance.get_id())
+                i, j = match(mat, threshold=threshold, method=method)
+                rows.append(i + offsets[frame])
+                other_rows.append(j + other_offsets[frame])
+        return np.concatenate(rows), np.concatenate(other_rows)
 
-    def load_frames(self, img_dir, label_paths, info_path):
+    @profiling.timed("Sequence.load_frames")
+    def load_frames(self, img_dir, label_paths, info_path, cache=True):
         """
         Initialises sequence from files
         Use when all the sequence data is known beforehand
         Load the image path and label data into each frame
+        :param img_dir: str: path to the directory of sequence images
+        :param label_paths: str: path to the label file
+        :param info_path: str: path to the seqinfo.ini file
+        :param cache: bool: whether to use (and fill) the on-disk cache of parsed labels (see pymoth.cache)
         :return: None
         """
         info = load_info(info_path)
-        self.init_frames(info=info, img_dir=img_dir)
-        with open(label_paths, "r") as file:
-            for line in file:
-                data = self.__extract_data(line)
-                kwargs = {"id_number": data["id"],
-                          "bounding_box": (data["bb_left"],
-                                           data["bb_top"],
-                                           data["bb_width"],
-                                           data["bb_height"]),
-                          "conf": data["conf"]}
-                self.create_instance(data["frame"], kwargs)
-
-    def init_frames(self, info=None, n=None, img_dir=None, info_path=None):
+        self.init_frames(info=info, img_dir=img_dir, cache=cache)
+        tag = "labels:%s" % self.label_format.get_signature()
+        data = cache_module.load(label_paths, tag) if cache else None
+        if data is not None:
+            profiling.count("label_cache.hits")
+            self.set_data(data)
+            return
+        self.add_labels(self.label_format.parse(label_paths))
+        if cache:
+            profiling.count("label_cache.misses")
+            cache_module.save(label_paths, tag, self.store.get_data())
+
+    def add_labels(self, labels):
+        """
+        Add parsed label columns to the sequence, adding frames if a label is beyond the last frame
+        :param labels: dict: column name -> np.array (e.g. from self.label_format.parse)
+        :return: np.array: the frame index of each added instance
+        """
+        frames, columns = self.label_format.to_store(labels)
+        profiling.count("labels.rows", len(frames))
+        for _ in range(self.get_n_frames(), int(frames.max(initial=-1)) + 1):
+            self.new_frame()
+        self.store.extend(frames, **columns)
+        return frames
+
+    def set_data(self, data):
+        """
+        Replace the labels of every instance with label store columns, adding frames if a label is beyond the last frame
+        :param data: dict: label store columns sorted by frame, including 'frame' (e.g. from LabelStore.get_data)
+        :return: None
+        """
+        frame = data["frame"]
+        for _ in range(self.get_n_frames(), int(frame[-1]) + 1 if frame.size else 0):
+            self.new_frame()
+        self.store.set_data(data)
+
+    def save_labels(self, label_path, file_format=None):
+        """
+        Write the labels of every instance to a file, sorted by frame
+        :param label_path: str: path to the label file
+        :param file_format: str: name of a registered label format (the format of the sequence if None)
+        :return: None
+        """
+        label_format = self.label_format if file_format is None else get_format(file_format)
+        label_format.write(label_path, label_format.from_store(self.store.get_data()))
+
+    def follow(self, label_path, poll_interval=0.5, img_dir=None):
+        """
+        Follow a label file that is still being written, see LabelFollower
+        :param label_path: str: path to the label file
+        :param poll_interval: float: seconds to wait between polls when no new lines were found
+        :param img_dir: str: directory of frame images named <frame number:06d>.jpg (no image paths if None)
+        :return: LabelFollower: call poll() to read new lines, or start() to follow the file on a background thread
+        """
+        return LabelFollower(self, label_path, poll_interval=poll_interval, img_dir=img_dir)
+
+    def init_frames(self, info=None, n=None, img_dir=None, info_path=None, cache=False):
         """
         :param info:
         :param n:
         :param img_dir:
         :param info_path:
+        :param cache: bool: whether to use the on-disk cache for the img_dir listing
         :return:
         """
         if info_path is not None:
             info = load_info(info_path)
         if info is not None:
             self.info = copy.deepcopy(info)
-            self.frames = [Frame(index=i) for i in range(self.info.seqLength)]
-        elif n is not None:
-            self.frames = [Frame(index=i) for i in range(n)]
-        else:
+            n = self.info.seqLength
+        elif n is None:
             raise ValueError("an info Namespace or the number of frames must be given")
+        self.store = LabelStore(n_frames=n, columns=self.label_format.get_store_columns())
+        self.frames = [Frame(index=i, store=self.store) for i in range(n)]
         if img_dir is not None:
-            self.set_frame_paths(img_dir)
+            self.set_frame_paths(img_dir, cache=cache)
 
     def new_frame(self, img_path=None):
-        self.frames.append(Frame(index=self.get_n_frames(), img_path=img_path))
+        self.store.add_frames(1)
+        self.frames.append(Frame(index=self.get_n_frames(), img_path=img_path, store=self.store))
 
-    def stream(self, image_only=False, scale=1):
+    def stream(self, image_only=False, scale=1, prefetch=0, workers=1):
         """
+        :param image_only: bool: whether to yield frame images rather than Frame objects
+        :param scale: float: scale of the yielded images
+        :param prefetch: int: number of frames decoded ahead of the consumer by background threads (0 to disable)
+        :param workers: int: number of decoder threads used when prefetching
         :return:
         """
-        for frame in self.frames:
-            if image_only:
-                yield frame.get_image(scale=scale)
-            else:
-                yield frame
+        if prefetch > 0:
+            for frame, image in self.__map_frames(self.__decode, prefetch, workers, image_only, scale):
+                yield image if image_only else frame
+        else:
+            for frame in self.frames:
+                if image_only:
+                    yield frame.get_image(scale=scale)
+                else:
+                    yield frame
         yield None
 
-    def set_frame_paths(self, img_dir):
+    async def astream(self, image_only=False, scale=1, prefetch=8):
+        """
+        Async counterpart of stream, frames are decoded on the pymoth.aio executor at most prefetch frames ahead
+        Unlike stream, no None is yielded after the last frame
+        :param image_only: bool: whether to yield frame images rather than Frame objects
+        :param scale: float: scale of the yielded images
+        :param prefetch: int: number of frames decoded ahead of the consumer
+        :return: async generator of frames (or images)
+        """
+        self.store.compact()                                            # Threads must only read the label store
+        queue = collections.deque()
+        frames = iter(self.frames)
+        try:
+            for frame in itertools.islice(frames, max(1, prefetch)):
+                queue.append((frame, asyncio.ensure_future(aio.run(self.__decode, frame, image_only, scale))))
+            while queue:
+                frame, task = queue.popleft()
+                next_frame = next(frames, None)
+                if next_frame is not None:
+                    queue.append((next_frame, asyncio.ensure_future(aio.run(self.__decode, next_frame, image_only,
+                                                                            scale))))
+                image = await task
+                yield image if image_only else frame
+        finally:
+            for _, task in queue:
+                task.cancel()
+
+    def render(self, width=1, scale=1, draw=True, show_ids=False, states=None, prefetch=8, workers=4):
+        """
+        Render the image of each frame on a thread pool, yielding them in order with at most prefetch frames in memory
+        :param width:
+        :param scale:
+        :param draw:
+        :param show_ids:
+        :param states:
+        :param prefetch: int: maximum number of frames rendered ahead of the consumer
+        :param workers: int: number of rendering threads
+        :return: generator of np.array: the rendered image of each frame
+        """
+        for _, image in self.__map_frames(self.__render, prefetch, workers, width, scale, draw, show_ids, states):
+            yield image
+
+    def render_to_video(self, path, fourcc="mp4v", fps=None, width=1, scale=1, draw=True, show_ids=False,
+                        states=None, prefetch=8, workers=4):
+        """
+        Render every frame and write them, in order, to a video file (memory use does not grow with sequence length)
+        :param path: str: path to the output video
+        :param fourcc: str: four character code of the codec
+        :param fps: float: frame rate of the video (the sequence frame rate if None, required without sequence info)
+        :param width:
+        :param scale:
+        :param draw:
+        :param show_ids:
+        :param states:
+        :param prefetch: int: maximum number of frames rendered ahead of the encoder
+        :param workers: int: number of rendering threads
+        :return: int: the number of frames written
+        """
+        if fps is None:
+            if self.info is None:
+                raise ValueError("fps must be given, the sequence has no info (seqinfo.ini) to get the frame rate from")
+            fps = self.info.frameRate
+        writer = None
+        n = 0
+        try:
+            for image in self.render(width=width, scale=scale, draw=draw, show_ids=show_ids, states=states,
+                                     prefetch=prefetch, workers=workers):
+                if writer is None:
+                    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps,
+                                             (image.shape[1], image.shape[0]))
+                    if not writer.isOpened():
+                        raise IOError("Could not open a %s video writer for %s" % (fourcc, path))
+                writer.write(image)
+                n += 1
+        finally:
+            if writer is not None:
+                writer.release()
+        return n
+
+    def render_to_dir(self, directory, ext=".jpg", width=1, scale=1, draw=True, show_ids=False, states=None,
+                      prefetch=8, workers=4):
+        """
+        Render every frame and write each to an image file, named after the frame number as in img1
+        :param directory: str: path to the output directory
+        :param ext: str: image file extension (determines the encoding)
+        :param width:
+        :param scale:
+        :param draw:
+        :param show_ids:
+        :param states:
+        :param prefetch: int: maximum number of frames rendered ahead
+        :param workers: int: number of rendering (and encoding) threads
+        :return: int: the number of frames written
+        """
+        os.makedirs(directory, exist_ok=True)
+        n = 0
+        for _ in self.__map_frames(self.__render_to_file, prefetch, workers, directory, ext, width, scale, draw,
+                                   show_ids, states):
+            n += 1
+        return n
+
+    def __map_frames(self, function, prefetch, workers, *args):
+        """
+        Apply function(frame, *args) to each frame on a thread pool, at most prefetch frames ahead of the consumer
+        :return: generator of (frame, result) in frame order
+        """
+        self.store.compact()                                            # Threads must only read the label store
+        executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        queue = collections.deque()
+        frames = iter(self.frames)
+        try:
+            for frame in itertools.islice(frames, max(1, prefetch)):
+                queue.append((frame, executor.submit(function, frame, *args)))
+            while queue:
+                frame, future = queue.popleft()
+                next_frame = next(frames, None)
+                if next_frame is not None:
+                    queue.append((next_frame, executor.submit(function, next_frame, *args)))
+                yield frame, future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def __decode(frame, image_only, scale):
+        """
+        Decode a frame image, or only load it into the shared image cache
+        """
+        if image_only:
+            return frame.get_image(scale=scale)
+        if frame.img_path is not None:
+            imread(frame.img_path)
+
+    @staticmethod
+    def __render(frame, width, scale, draw, show_ids, states):
+        return frame.get_image(width=width, scale=scale, draw=draw, show_ids=show_ids, states=states)
+
+    @staticmethod
+    def __render_to_file(frame, directory, ext, width, scale, draw, show_ids, states):
+        image = frame.get_image(width=width, scale=scale, draw=draw, show_ids=show_ids, states=states)
+        path = os.path.join(directory, "%06d%s" % (frame.index + 1, ext))
+        if not cv2.imwrite(path, image):
+            raise IOError("cv2.imwrite(%s) failed" % path)
+
+    def set_frame_paths(self, img_dir, cache=False):
         """
         :param img_dir:
+        :param cache: bool: whether to use (and fill) the on-disk cache of the directory listing
         :return:
         """
         self.img_dir = img_dir
-        frame_paths = os.listdir(self.img_dir)
+        listing = cache_module.load(self.img_dir, "listing", mmap=False) if cache else None
+        if listing is None:
+            frame_paths = os.listdir(self.img_dir)
+            if cache:
+                cache_module.save(self.img_dir, "listing", {"paths": np.array(frame_paths, dtype=str)})
+        else:
+            frame_paths = listing["paths"].tolist()
         for path in frame_paths:
             i = int(path.split(".")[0]) - 1
             self.set_frame_path(i, "%s/%s" % (self.img_dir, path))
@@ -116,8 +358,6 @@ class Sequence(object):
         :return: None
         """
         self.frames[frame].img_path = path
-        for instance in self.frames[frame].instances:
-            instance.path = path
 
     def create_instance(self, frame, kwargs):
         """
@@ -136,17 +376,39 @@ class Sequence(object):
         self.frames[frame].add_instance(instance)
 
     def get_tracklets(self, n_ids=None):
-        if n_ids is None:
-            n_ids = self.get_n_ids()
-        tracklets = [[] for _ in range(n_ids)]
-        for id in range(n_ids):
-            for instance in self.get_instances(id=id):
-                try:
-                    if instance.frame_index == tracklets[id][-1][-1].frame_index + 1:
-                        tracklets[id][-1].append(instance)
-                except IndexError:
-                    tracklets[id].append([instance])
-        return tracklets
+        """
+        Tracklets are runs of instances with the same id in consecutive frames (instances with id -1 are ignored)
+        :param n_ids: int: only return the tracklets of the first n_ids ids
+        :return: list: for each id (in the order of get_unique_ids()), a list of tracklets (lists of Instances)
+        """
+        arrays = self.get_tracklet_arrays()
+        offsets = arrays["offsets"]
+        instances = self.__get_instances(arrays["rows"])
+        tracklets = [instances[i0:i1] for i0, i1 in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+        starts = np.flatnonzero(np.diff(arrays["id"])) + 1
+        tracklets = [tracklets[i0:i1] for i0, i1 in zip(np.append(0, starts), np.append(starts, len(tracklets)))
+                     if i1 > i0]
+        return tracklets if n_ids is None else tracklets[:n_ids]
+
+    def get_tracklet_arrays(self):
+        """
+        Split instances into tracklets with one sort by (id, frame), a new tracklet starting at each gap in frames
+        Tracklet t is made of rows[offsets[t]:offsets[t + 1]] (and likewise for frame and box)
+        :return: dict: 'id' (one per tracklet), 'offsets', and label store 'rows', 'frame' and 'box' of each instance
+        """
+        ids = self.get_ids()
+        frames = self.store.get("frame")
+        rows = np.flatnonzero(ids != -1)
+        rows = rows[np.lexsort((frames[rows], ids[rows]))]
+        ids = ids[rows]
+        frames = frames[rows]
+        starts = np.flatnonzero((ids[1:] != ids[:-1]) | (frames[1:] != frames[:-1] + 1)) + 1
+        offsets = np.concatenate(([0], starts, [len(rows)])) if len(rows) else np.zeros(1, dtype=np.int64)
+        return {"id": ids[offsets[:-1]],
+                "offsets": offsets,
+                "rows": rows,
+                "frame": frames,
+                "box": self.get_boxes()[rows]}
 
     def get_images(self, width=1, scale=1, draw=False, show_ids=False):
         """
@@ -156,10 +418,12 @@ class Sequence(object):
         :param show_ids:
         :return:
         """
-        images = np.empty((self.get_n_frames(), self.info.imHeight, self.info.inWidth, 3),
-                          dtype=np.uint8)
+        images = None
         for i, frame in enumerate(self.frames):
-            images[i] = frame.get_image(width=width, scale=scale, draw=draw, show_ids=show_ids)
+            image = frame.get_image(width=width, scale=scale, draw=draw, show_ids=show_ids)
+            if images is None:
+                images = np.empty((self.get_n_frames(),) + image.shape, dtype=np.uint8)
+            images[i] = image
         return images
 
     def get_image(self, index=0, width=1, scale=1, draw=False, show_ids=False):
@@ -176,10 +440,16 @@ class Sequence(object):
         """
         :return:
         """
-        if 0 <= frame < self.info.seqLength:
+        if 0 <= frame < self.get_n_frames():
             return self.frames[frame]
         else:
-            raise IndexError("Index %i out of range for Sequence with length %i" % (frame, self.info.seqLength))
+            raise IndexError("Index %i out of range for Sequence with length %i" % (frame, self.get_n_frames()))
+
+    def get_img_paths(self):
+        """
+        :return: list: the image path of each frame
+        """
+        return [frame.img_path for frame in self.frames]
 
     def get_frames(self):
         """
@@ -201,16 +471,13 @@ class Sequence(object):
         """
         if frame is None:
             if id is None:
-                return len([1 for frame in self.frames for _ in frame.instances])
+                return len(self.store)
             else:
-                return len([1 for frame in self.frames for instance in frame.instances if instance.id == id])
+                return len(self.store.get_id_rows(id))
         else:
             if not 0 <= frame < self.get_n_frames():
                 return 0
-            if id is None:
-                return len([1 for _ in self.frames[frame].instances])
-            else:
-                return len([1 for instance in self.frames[frame].instances if instance.id == id])
+            return self.frames[frame].get_n_instances(id=id)
 
     def get_instances(self, frame=None, id=None):
         """
@@ -222,23 +489,46 @@ class Sequence(object):
             if id is None:
                 return [instance for frame in self.frames for instance in frame.instances]
             else:
-                return [instance for frame in self.frames for instance in frame.instances if instance.get_id() == id]
+                return self.__get_instances(self.store.get_id_rows(id))
         else:
             if not 0 <= frame < self.get_n_frames():
                 return []
             if id is None:
                 return self.frames[frame].instances
             else:
-                return [instance for instance in self.frames[frame] if instance.get_id() == id]
+                return self.frames[frame].get_instances(id=id)
+
+    def __get_instances(self, rows):
+        """
+        :param rows: np.array: label store row indexes
+        :return: list: the Instance at each row
+        """
+        frames = self.store.get("frame")[rows]
+        indexes = rows - self.store.get_offsets()[frames]
+        touched = np.zeros(self.get_n_frames(), dtype=bool)
+        touched[frames] = True
+        counts = np.where(touched, self.store.get_counts(), 0)
+        positions = (np.cumsum(counts) - counts)[frames] + indexes
+        # Read the instances of each frame once, into a flat list indexed by position
+        # The cyclic collector is paused meanwhile, it would otherwise run many times while views are materialised
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            frames = np.flatnonzero(touched).tolist()
+            instances = list(itertools.chain.from_iterable(self.frames[f].instances for f in frames))
+            return [instances[i] for i in positions.tolist()]
+        finally:
+            if enabled:
+                gc.enable()
 
     def get_ids(self, frame=None):
         """
-        :return:
+        :return: np.array: the id of each instance in the frame or sequence
         """
         if frame is None:
-            return [instance.get_id() for frame in self.frames for instance in frame.instances]
+            return self.store.get("id")
         else:
-            return [instance.get_id() for instance in self.get_instances(frame=frame)]
+            return self.frames[frame].get_ids()
 
     def get_n_ids(self, frame=None):
         """
@@ -257,12 +547,9 @@ class Sequence(object):
         """
         :param frame:
         :param id:
-        :return:
+        :return: np.array: bounding boxes (left, top, width, height), a view of the label store if id is None
         """
-        boxes = np.empty((self.get_n_instances(frame=frame, id=id), 4))
-        for i, instance in enumerate(self.get_instances(frame=frame, id=id)):
-            boxes[i] = instance.get_box()
-        return boxes
+        return self.__select("box", frame=frame, id=id)
 
     def get_rects(self, frame=None, id=None):
         """
@@ -284,55 +571,75 @@ class Sequence(object):
         """
         :param frame:
         :param id:
-        :return:
+        :return: np.array: the confidence of each instance, a view of the label store if id is None
         """
-        if frame is None:
-            if id is None:
-                return [instance.conf for frame in self.frames for instance in frame.instances]
-            else:
-                return [instance.conf for frame in self.frames for instance in frame.instances if instance.id == id]
-        else:
-            if id is None:
-                return [instance.conf for instance in self.frames[frame].instances]
-            else:
-                return [instance.conf for instance in self.frames[frame].instances if instance.id == id]
+        return self.__select("conf", frame=frame, id=id)
 
-    def get_appearances_by_id(self, shape=None):
+    def get_coordinates(self, frame=None, id=None):
+        """
+        :param frame:
+        :param id:
+        :return: np.array: the world coordinates (x, y, z) of each instance (formats with world coordinates only)
+        """
+        return self.__select("coordinates", frame=frame, id=id)
+
+    def get_labels(self, key, frame=None, id=None):
+        """
+        :param key: str: name of a label store column (e.g. 'class' or 'visibility' for the MOT-gt format)
+        :param frame:
+        :param id:
+        :return: np.array: the column values of each instance, a view of the label store if id is None
+        """
+        if key not in self.store.columns:
+            raise KeyError("no %s labels in the %s format" % (key, self.label_format.name))
+        return self.__select(key, frame=frame, id=id)
+
+    def get_appearances_by_id(self, shape=None, workers=4):
         """
         :param shape:
-        :return:
+        :param workers: int: number of threads used to decode frames and crop appearances
+        :return: list: appearances of each id (in the order of get_unique_ids())
         """
         print("Getting the appearances from %s frames" % self.get_n_frames())
-        if shape is None:
-            appearances = [[] for _ in self.get_unique_ids()]
-            progress_bar = Progbar(self.get_n_frames(), width=30, verbose=1, interval=1)
-            for i, frame in enumerate(self.frames):
-                for appearance, id in zip(frame.get_appearances(shape=shape), frame.get_ids()):
-                    appearances[id - 1].append(appearance)
-                progress_bar.update(i)
-        else:
-            appearances = [np.empty(tuple([self.get_n_instances(id=id)] + list(shape)), dtype=np.uint8)
-                           for id in self.get_unique_ids()]
-            indexes = [count() for _ in self.get_unique_ids()]
-            progress_bar = Progbar(self.get_n_frames(), width=30, verbose=1, interval=1)
-            for i, frame in enumerate(self.frames):
-                for appearance, id in zip(frame.get_appearances(shape=shape), frame.get_ids()):
-                    appearances[id - 1][next(indexes[id - 1])] = appearance
-                progress_bar.update(i)
+        ids = self.get_ids()
+        order = np.argsort(ids, kind="stable")
+        _, starts = np.unique(ids[order], return_index=True)
+        appearances = extract_crops(self.get_img_paths(), self.store.get("frame")[order], self.get_rects()[order],
+                                    shape=shape, workers=workers, verbose=1)
         print("\n")
-        return appearances
+        if shape is None:
+            return [appearances[i0:i1] for i0, i1 in zip(starts, list(starts[1:]) + [len(appearances)])]
+        return np.split(appearances, starts[1:])
 
-    def get_appearances(self, frame=None, id=None, shape=None):
+    def get_appearances(self, frame=None, id=None, shape=None, workers=4):
         """
         :param id:
         :param shape:
+        :param workers: int: number of threads used to decode frames and crop appearances
         :return:
         """
         if frame is None:
-            return self.__from_all_frames(id=id, shape=shape)
+            return self.__from_all_frames(id=id, shape=shape, workers=workers)
         if frame is not None:
             return self.__from_frame(frame, id=id, shape=shape)
 
+    async def aget_appearances(self, frame=None, id=None, shape=None, batch_size=64):
+        """
+        Async counterpart of get_appearances, crops are extracted in batches on the pymoth.aio executor
+        :param frame: int: index of a frame (all frames if None)
+        :param id: int: only crop instances with this id (all if None)
+        :param shape: tuple: shape of the output crops (crops are not resized if None)
+        :param batch_size: int: number of crops extracted per executor call
+        :return: np.array of crops if shape is given, else a list of crops
+        """
+        if frame is not None:
+            if not 0 <= frame < self.get_n_frames():
+                return self.__from_frame(frame, id=id, shape=shape)
+            return await self.frames[frame].aget_appearances(id=id, shape=shape)
+        rows = slice(None) if id is None else self.store.get_id_rows(id)
+        return await aio.extract_crops(self.get_img_paths(), self.store.get("frame")[rows], self.get_rects()[rows],
+                                       shape=shape, batch_size=batch_size)
+
     def __from_frame(self, frame, id=None, shape=None):
         if not 0 <= frame < self.get_n_frames():
             if shape is None:
@@ -342,73 +649,60 @@ class Sequence(object):
         else:
             return self.frames[frame].get_appearances(id=id, shape=shape)
 
-    def __from_all_frames(self, id=None, shape=None):
+    def __from_all_frames(self, id=None, shape=None, workers=4):
         print("Getting the appearances from %s frames" % self.get_n_frames())
-        if shape is None:
-            appearances = []
-            if id is None:
-                progress_bar = Progbar(self.get_n_frames(), width=30, verbose=1, interval=1)
-                for i, frame in enumerate(self.frames):
-                    appearances += frame.get_appearances(shape=shape)
-                    progress_bar.update(i)
-            else:
-                progress_bar = Progbar(self.get_n_instances(id=id), width=30, verbose=1, interval=1)
-                for i, instance in enumerate(self.get_instances(id=id)):
-                    appearances.append(instance.get_appearance(shape=shape))
-                    progress_bar.update(i)
-        else:
-            appearances = np.empty((self.get_n_instances(id=id), shape[0], shape[1], shape[2]),
-                                   dtype=np.uint8)
-            if id is None:
-                progress_bar = Progbar(self.get_n_frames(), width=30, verbose=1, interval=1)
-                j = 0
-                for i, frame in enumerate(self.frames):
-                    n = frame.get_n_instances()
-                    appearances[j:j + n] = frame.get_appearances(shape=shape)
-                    j += n
-                    progress_bar.update(i)
-            else:
-                progress_bar = Progbar(self.get_n_instances(id=id), width=30, verbose=1, interval=1)
-                for i, instance in enumerate(self.get_instances(id=id)):
-                    appearances[i] = instance.get_appearance(shape=shape)
-                    progress_bar.update(i)
+        rows = slice(None) if id is None else self.store.get_id_rows(id)
+        appearances = extract_crops(self.get_img_paths(), self.store.get("frame")[rows], self.get_rects()[rows],
+                                    shape=shape, workers=workers, verbose=1)
         print("\n")
         return appearances
 
-    def show(self, frame=None, scale=1, width=1, draw=False, show_ids=False, restrict_fps=True, states=None):
+    def show(self, frame=None, scale=1, width=1, draw=False, show_ids=False, restrict_fps=True, states=None,
+             drop_frames=False):
         """
         :param frame:
         :param scale:
         :param width:
         :param draw:
         :param show_ids:
-        :param restrict_fps:
+        :param restrict_fps: bool: whether to play at the sequence frame rate (else frames are shown as fast as they
+        are rendered, and the achieved frame rate is still measured)
         :param states:
-        :return:
+        :param drop_frames: bool: whether to skip frames to keep real time when rendering falls behind (if restrict_fps)
+        :return: dict: playback statistics (target and achieved fps, frames shown and dropped) if playing the sequence
         """
         if frame is None:
-            clock = Clock(self.info.frameRate)
-            for frame in self.frames:
-                image = frame.get_image(width=width, scale=scale, draw=draw, show_ids=show_ids, states=states)
+            clock = Clock(self.info.frameRate, drop_frames=drop_frames)
+            i = 0
+            while i < self.get_n_frames():
+                image = self.frames[i].get_image(width=width, scale=scale, draw=draw, show_ids=show_ids, states=states)
                 cv2.imshow(self.info.name, image)
                 cv2.waitKey(1)
+                i += 1
                 if restrict_fps:
-                    clock.toc()
+                    i += clock.toc()
+                else:
+                    clock.tick()
             cv2.destroyWindow(self.info.name)
+            return clock.get_stats()
         else:
             image = self.frames[frame].get_image(width=width, scale=scale, draw=draw, show_ids=show_ids, states=states)
             cv2.imshow(self.info.name, image)
             cv2.waitKey(1)
 
-    def __extract_data(self, line):
+    def __select(self, key, frame=None, id=None):
         """
-        Extract label data from a line of the labels file
-        :param line: str: line from a label file
-        :return: dict: dictionary of data from file
+        :param key: str: name of a label store column
+        :param frame: int: index of a frame (all frames if None)
+        :param id: int: id of the instances to select (all instances if None)
+        :return: np.array: column values for the selected instances
         """
-        line = line.replace("\n", "").split(",")
-        data = {}
-        for key, index in self.file_format.items():
-            data[key] = convert(line[index])
-        data["frame"] -= 1
-        return data
+        if frame is None:
+            column = self.store.get(key)
+            if id is None:
+                return column
+            return column[self.store.get_id_rows(id)]
+        column = self.frames[frame].get_label(key)
+        if id is None:
+            return column
+        return column[self.frames[frame].get_ids() == id]
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""
+A SpatialIndex finds which rects (x1, y1, x2, y2) overlap, without testing every pair.
+Rects are sorted by x1 (sort and sweep): only rects whose x1 lies within one maximum rect width of a query can
+intersect it, so for boxes that are narrow compared to the image (e.g. pedestrians) each query tests a few candidates
+instead of every rect.
+"""
+
+import numpy as np
+
+
+class SpatialIndex(object):
+
+    def __init__(self, rects):
+        """
+        :param rects: np.array: 2D array of rects (x1, y1, x2, y2), rects with non-finite coordinates are never returned
+        """
+        self.rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        valid = np.flatnonzero(np.isfinite(self.rects).all(axis=1))
+        self._order = valid[np.argsort(self.rects[valid, 0], kind="stable")]
+        self._x1 = self.rects[self._order, 0]
+        widths = self.rects[self._order, 2] - self._x1
+        self._max_width = max(0., float(widths.max())) if widths.size else 0.
+
+    def __len__(self):
+        return len(self.rects)
+
+    def query(self, rect):
+        """
+        :param rect: np.array: a rect (x1, y1, x2, y2)
+        :return: np.array: sorted indexes of the rects that intersect rect (with a non-zero area)
+        """
+        _, indexes = self.query_pairs(np.reshape(rect, (1, 4)))
+        return np.sort(indexes)
+
+    def query_pairs(self, rects):
+        """
+        :param rects: np.array: 2D array of query rects (x1, y1, x2, y2)
+        :return: (np.array, np.array): indexes of query rects and of the indexed rects they intersect
+        """
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        # Range of candidates in x1 order: x1 > query x1 - max width and x1 < query x2
+        lo = np.searchsorted(self._x1, rects[:, 0] - self._max_width, side="right")
+        hi = np.searchsorted(self._x1, rects[:, 2], side="left")
+        counts = np.clip(hi - lo, 0, None)
+        counts[~np.isfinite(rects).all(axis=1)] = 0
+        queries = np.repeat(np.arange(len(rects)), counts)
+        starts = np.cumsum(counts) - counts
+        positions = np.arange(len(queries)) - np.repeat(starts - lo, counts)
+        candidates = self._order[positions]
+        # Exact test of the candidates
+        r1 = rects[queries]
+        r2 = self.rects[candidates]
+        keep = ((np.minimum(r1[:, 2], r2[:, 2]) > np.maximum(r1[:, 0], r2[:, 0])) &
+                (np.minimum(r1[:, 3], r2[:, 3]) > np.maximum(r1[:, 1], r2[:, 1])))
+        return queries[keep], candidates[keep]
+
+    def get_pairs(self):
+        """
+        :return: (np.array, np.array): indexes (i, j), i < j, of every pair of indexed rects that intersect
+        """
+        i, j = self.query_pairs(self.rects)
+        keep = i < j
+        return i[keep], j[keep]
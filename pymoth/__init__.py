@@ -2,9 +2,13 @@
 
 from pymoth.Namespace import Namespace
 from pymoth.Sequence import Sequence
+from pymoth.LazySequence import LazySequence
+from pymoth.LabelFollower import LabelFollower
 from pymoth.Frame import Frame
 from pymoth.Instance import Instance
 from pymoth.Clock import Clock
 from pymoth.DataSet import DataSet
+from pymoth.PatchStore import PatchStore
+from pymoth.SpatialIndex import SpatialIndex
 
 name = "pymoth"
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+asyncio support: blocking work (image decoding, cropping, resizing) is run on a shared bounded thread pool,
+and the number of calls in flight per event loop is capped, so that an event loop serving many concurrent
+requests is never blocked and queued work stays bounded.
+
+configure(workers=8, max_pending=64)
+get_executor()
+run(function, *args, **kwargs)
+extract_crops(img_paths, frames, rects, shape=None, keep_aspect=True, batch_size=64)
+shutdown()
+"""
+
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from pymoth import utils
+
+_workers = 8                                                            # Threads of the shared executor
+_max_pending = 64                                                       # Calls in flight per event loop
+_executor = None
+_semaphores = weakref.WeakKeyDictionary()                               # Event loop -> asyncio.Semaphore
+_lock = threading.Lock()
+
+
+def configure(workers=8, max_pending=64):
+    """
+    :param workers: int: number of threads decoding images
+    :param max_pending: int: maximum number of calls in flight (running or queued) per event loop
+    :return: None
+    """
+    global _workers, _max_pending
+    shutdown()
+    with _lock:
+        _workers = max(1, workers)
+        _max_pending = max(1, max_pending)
+        _semaphores.clear()
+
+
+def get_executor():
+    """
+    :return: ThreadPoolExecutor: the shared executor (created on first use)
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix="pymoth-aio")
+        return _executor
+
+
+async def run(function, *args, **kwargs):
+    """
+    Run function(*args, **kwargs) on the shared executor, waiting first if max_pending calls are already in flight
+    :return: the result of function
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        semaphore = _semaphores.get(loop)
+        if semaphore is None:
+            semaphore = _semaphores[loop] = asyncio.Semaphore(_max_pending)
+    async with semaphore:
+        return await loop.run_in_executor(get_executor(), functools.partial(function, *args, **kwargs))
+
+
+async def extract_crops(img_paths, frames, rects, shape=None, keep_aspect=True, batch_size=64):
+    """
+    Async counterpart of utils.extract_crops, crops are extracted in batches of rows run concurrently
+    :param img_paths: list: path to the image of each frame
+    :param frames: np.array: frame index of each crop
+    :param rects: np.array: 2D array of rects (x1, y1, x2, y2) of each crop
+    :param shape: tuple: shape of the output crops (crops are not resized if None)
+    :param keep_aspect: bool: whether to keep the crop aspect ratio when resizing
+    :param batch_size: int: maximum number of crops extracted per executor call (unless a frame has more crops)
+    :return: np.array of crops if shape is given, else a list of crops (in the order of rects)
+    """
+    frames = np.asarray(frames, dtype=np.int64).reshape(-1)
+    rects = np.asarray(rects).reshape(-1, 4)
+    order = np.argsort(frames, kind="stable")
+    out = None if shape is None else np.empty((len(frames),) + tuple(shape), dtype=np.uint8)
+    # Pack whole frames into batches of up to batch_size crops, so that each image is read by a single call
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(frames[order])) + 1, [len(order)]))
+    batches, start = [], 0
+    for previous, end in zip(bounds[1:-1].tolist(), bounds[2:].tolist()):
+        if end - start > batch_size:                                    # The next frame does not fit in the batch
+            batches.append(order[start:previous])
+            start = previous
+    if len(order):
+        batches.append(order[start:])
+    results = await asyncio.gather(*[run(utils.extract_crops, img_paths, frames[rows], rects[rows], shape=shape,
+                                         keep_aspect=keep_aspect, workers=1) for rows in batches])
+    if shape is None:
+        crops = [None] * len(frames)
+        for rows, batch in zip(batches, results):
+            for row, crop in zip(rows, batch):
+                crops[row] = crop
+        return crops
+    for rows, batch in zip(batches, results):
+        out[rows] = batch
+    return out
+
+
+def shutdown():
+    """
+    Shut the shared executor down, a new one is created on next use
+    :return: None
+    """
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks of pymoth hot paths on synthetic MOTChallenge-layout data.
+Run with python -m pymoth.benchmark --help
+"""
+
+from pymoth.benchmark.synthetic import make_sequence
+from pymoth.benchmark.synthetic import make_data_set
+from pymoth.benchmark.suite import run
+from pymoth.benchmark.suite import compare
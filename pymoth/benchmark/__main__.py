@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+
+from pymoth.benchmark import compare
+from pymoth.benchmark import run
+
+
+def main(args):
+    results = run(args.directory, n_sequences=args.sequences, repeat=args.repeat, workers=args.workers,
+                  benchmarks=args.benchmarks, n_frames=args.frames, n_boxes=args.boxes, width=args.width,
+                  height=args.height)
+    for name, result in results["results"].items():
+        print("%-20s median %9.4f s  min %9.4f s" % (name, result["median"], result["min"]))
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare is not None:
+        with open(args.compare, "r") as file:
+            ratios = compare(json.load(file), results)
+        print("\nNew / old median time")
+        for name, ratio in ratios.items():
+            print("%-20s %6.2fx" % (name, ratio))
+
+
+parser = argparse.ArgumentParser(prog="python -m pymoth.benchmark")
+parser.add_argument("-d", "--directory", type=str, required=True,
+                    help="Working directory of the benchmark (the synthetic data set is created if it does not exist)")
+parser.add_argument("--sequences", type=int, default=2,
+                    help="Number of sequences in the data set")
+parser.add_argument("--frames", type=int, default=100,
+                    help="Number of frames per sequence")
+parser.add_argument("--boxes", type=int, default=20,
+                    help="Number of ground truth boxes per frame")
+parser.add_argument("--width", type=int, default=640,
+                    help="Image width")
+parser.add_argument("--height", type=int, default=480,
+                    help="Image height")
+parser.add_argument("--repeat", type=int, default=3,
+                    help="Number of timed runs of each benchmark")
+parser.add_argument("--workers", type=int, default=4,
+                    help="Number of threads given to functions that take workers")
+parser.add_argument("--benchmarks", type=str, nargs="+", default=None,
+                    help="Names of the benchmarks to run (all by default)")
+parser.add_argument("-o", "--output", type=str, default=None,
+                    help="Path to write the results to (JSON)")
+parser.add_argument("--compare", type=str, default=None,
+                    help="Path to the results of a previous run to compare against")
+args = parser.parse_args()
+main(args)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""
+Timings of pymoth hot paths on a synthetic data set, written as JSON so that runs can be compared across commits.
+
+run(directory, n_sequences=2, repeat=3, workers=4, shape=(128, 64, 3), benchmarks=None, **kwargs)
+compare(old, new)
+"""
+
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+import cv2
+import numpy as np
+
+import pymoth
+from pymoth import cache
+from pymoth import DataSet
+from pymoth import Sequence
+from pymoth.utils import image_cache
+from pymoth.utils import batch_iou2
+from pymoth.utils import iou2
+from pymoth.benchmark.synthetic import make_data_set
+
+
+def run(directory, n_sequences=2, repeat=3, workers=4, shape=(128, 64, 3), benchmarks=None, **kwargs):
+    """
+    Create a synthetic data set (unless it exists) and time each benchmark
+    :param directory: str: working directory, holding the synthetic data set (data) and label cache (cache)
+    :param n_sequences: int: number of sequences in the data set
+    :param repeat: int: number of timed runs of each benchmark
+    :param workers: int: number of threads given to functions that take workers
+    :param shape: tuple: shape of the appearances cropped by the get_appearances benchmark
+    :param benchmarks: list: names of the benchmarks to run (all if None)
+    :param kwargs: arguments of synthetic.make_sequence (n_frames, n_boxes, width, height, ...)
+    :return: dict: environment, parameters and for each benchmark its timings in seconds
+    """
+    data_dir = os.path.join(directory, "data")
+    if not os.path.isdir(data_dir):
+        make_data_set(data_dir, n_sequences=n_sequences, **kwargs)
+    seq_dir = os.path.join(data_dir, "train", sorted(os.listdir(os.path.join(data_dir, "train")))[0])
+    paths = (os.path.join(seq_dir, "img1"), os.path.join(seq_dir, "gt", "gt.txt"), os.path.join(seq_dir, "seqinfo.ini"))
+    det_path = os.path.join(seq_dir, "det", "det.txt")
+    cache_dir = cache.get_dir()
+    cache.set_dir(os.path.join(directory, "cache"))
+    try:
+        gt = _load(paths[0], paths[1], paths[2])
+        suite = {
+            "DataSet": (None, lambda _: DataSet(data_dir, cache=False)),
+            "load_frames": (None, lambda _: _load(*paths)),
+            "load_frames_cached": (lambda: _load(*paths, cache=True), lambda _: _load(*paths, cache=True)),
+            "iou2": (lambda: _load(paths[0], det_path, paths[2]),
+                     lambda det: [iou2(det.get_rects(frame=f), gt.get_rects(frame=f))
+                                  for f in range(det.get_n_frames())]),
+            "batch_iou2": (lambda: _load(paths[0], det_path, paths[2]),
+                           lambda det: batch_iou2(det.get_rects(), det.store.get_offsets(), gt.get_rects(),
+                                                  gt.store.get_offsets(), sparse=True)),
+            "set_ids": (lambda: _load(paths[0], det_path, paths[2]), lambda det: det.set_ids(gt)),
+            "get_tracklets": (None, lambda _: gt.get_tracklets()),
+            "get_tracklets_cold": (lambda: _load(*paths), lambda sequence: sequence.get_tracklets()),
+            "get_appearances": (image_cache.clear, lambda _: gt.get_appearances(shape=shape, workers=workers)),
+            "stream": (image_cache.clear, lambda _: list(gt.stream(image_only=True, prefetch=2 * workers,
+                                                                    workers=workers))),
+        }
+        results = {}
+        for name, (setup, function) in suite.items():
+            if benchmarks is None or name in benchmarks:
+                results[name] = _time(setup, function, repeat)
+    finally:
+        cache.set_dir(cache_dir)
+    return {"environment": _environment(),
+            "parameters": dict(kwargs, n_sequences=n_sequences, repeat=repeat, workers=workers, shape=list(shape),
+                               n_instances=len(gt.store)),
+            "results": results}
+
+
+def compare(old, new):
+    """
+    :param old: dict: results of a previous run (e.g. on the parent commit)
+    :param new: dict: results of the new run
+    :return: dict: for each benchmark in both runs, the ratio of new to old median time (< 1 is faster)
+    """
+    return {name: new["results"][name]["median"] / max(1e-12, old["results"][name]["median"])
+            for name in new["results"] if name in old["results"]}
+
+
+def _load(img_dir, label_path, info_path, cache=False):
+    sequence = Sequence()
+    sequence.load_frames(img_dir, label_path, info_path, cache=cache)
+    return sequence
+
+
+def _time(setup, function, repeat):
+    """
+    :param setup: function: called before each run, its result is passed to function (not timed)
+    :param function: function: the timed function
+    :param repeat: int: number of runs
+    :return: dict: min, median, mean and all times in seconds
+    """
+    times = []
+    for _ in range(max(1, repeat)):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        function(state)
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times), "mean": statistics.mean(times), "times": times}
+
+
+def _environment():
+    """
+    :return: dict: versions and the git commit of pymoth (None outside a git checkout)
+    """
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(pymoth.__file__),
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()}
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+Synthetic MOTChallenge-layout sequences: <name>/img1/*.jpg, <name>/det/det.txt, <name>/gt/gt.txt and
+<name>/seqinfo.ini. Targets move at constant velocity and bounce off the image borders, detections are jittered
+ground truth boxes with misses and false positives.
+
+make_sequence(directory, name="SYN-01", n_frames=100, n_boxes=20, width=640, height=480, ...)
+make_data_set(directory, n_sequences=2, split="train", **kwargs)
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+
+def make_sequence(directory, name="SYN-01", n_frames=100, n_boxes=20, width=640, height=480, frame_rate=30,
+                  miss_rate=0.1, false_positives=2, jitter=2., jpeg_quality=90, seed=0):
+    """
+    :param directory: str: directory in which the sequence directory is created
+    :param name: str: name of the sequence
+    :param n_frames: int: number of frames
+    :param n_boxes: int: number of targets (ground truth boxes per frame)
+    :param width: int: image width
+    :param height: int: image height
+    :param frame_rate: int: frame rate written to seqinfo.ini
+    :param miss_rate: float: probability of a target not being detected in a frame
+    :param false_positives: float: mean number of false positive detections per frame
+    :param jitter: float: standard deviation (pixels) of the noise added to detected boxes
+    :param jpeg_quality: int: JPEG quality of the frame images
+    :param seed: int: seed of the random generator
+    :return: str: path to the sequence directory
+    """
+    rng = np.random.RandomState(seed)
+    path = os.path.join(directory, name)
+    for sub_dir in ("img1", "det", "gt"):
+        os.makedirs(os.path.join(path, sub_dir), exist_ok=True)
+    with open(os.path.join(path, "seqinfo.ini"), "w") as file:
+        file.write("[Sequence]\nname=%s\nimDir=img1\nframeRate=%i\nseqLength=%i\nimWidth=%i\nimHeight=%i\n"
+                   "imExt=.jpg\n" % (name, frame_rate, n_frames, width, height))
+    gt = _make_tracks(rng, n_frames, n_boxes, width, height)
+    det = _make_detections(rng, gt, width, height, miss_rate, false_positives, jitter)
+    _write_labels(os.path.join(path, "gt", "gt.txt"), gt)
+    _write_labels(os.path.join(path, "det", "det.txt"), det)
+    colors = rng.randint(0, 255, (n_boxes, 3))
+    background = rng.randint(0, 255, (height // 8 + 1, width // 8 + 1, 3)).astype(np.uint8)
+    background = cv2.resize(background, (width, height), interpolation=cv2.INTER_LINEAR)
+    for frame in range(n_frames):
+        image = background.copy()
+        for _, id_number, x, y, w, h, _ in gt[gt[:, 0] == frame + 1]:
+            cv2.rectangle(image, (int(x), int(y)), (int(x + w), int(y + h)), colors[int(id_number) - 1].tolist(), -1)
+        cv2.imwrite(os.path.join(path, "img1", "%06d.jpg" % (frame + 1)), image,
+                    [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    return path
+
+
+def make_data_set(directory, n_sequences=2, split="train", **kwargs):
+    """
+    :param directory: str: directory of the data set (sequences are created in directory/split)
+    :param n_sequences: int: number of sequences
+    :param split: str: name of the split directory
+    :param kwargs: arguments of make_sequence
+    :return: str: path to the data set directory
+    """
+    seed = kwargs.pop("seed", 0)
+    for i in range(n_sequences):
+        make_sequence(os.path.join(directory, split), name="SYN-%02i" % (i + 1), seed=seed + i, **kwargs)
+    return directory
+
+
+def _make_tracks(rng, n_frames, n_boxes, width, height):
+    """
+    :return: np.array: gt rows (frame, id, left, top, width, height, conf) sorted by frame
+    """
+    size = np.stack((rng.uniform(0.03, 0.08, n_boxes) * width, rng.uniform(0.15, 0.35, n_boxes) * height), axis=1)
+    limit = np.array([width, height]) - size
+    position = rng.uniform(0, 1, (n_boxes, 2)) * limit
+    velocity = rng.uniform(-0.005, 0.005, (n_boxes, 2)) * np.array([width, height])
+    # Bouncing off the borders is a reflection of the unbounded position into [0, limit]
+    t = np.arange(n_frames)[:, None, None]
+    position = np.abs((position + velocity * t) % (2 * limit) - limit)
+    position = limit - position
+    frames = np.repeat(np.arange(1, n_frames + 1), n_boxes)
+    ids = np.tile(np.arange(1, n_boxes + 1), n_frames)
+    boxes = np.concatenate((position.reshape(-1, 2), np.tile(size, (n_frames, 1))), axis=1)
+    return np.column_stack((frames, ids, np.round(boxes, 2), np.ones(len(frames))))
+
+
+def _make_detections(rng, gt, width, height, miss_rate, false_positives, jitter):
+    """
+    :return: np.array: det rows (frame, -1, left, top, width, height, conf) sorted by frame
+    """
+    det = gt[rng.uniform(size=len(gt)) >= miss_rate].copy()
+    det[:, 1] = -1
+    det[:, 2:6] += rng.normal(0, jitter, (len(det), 4))
+    det[:, 6] = rng.uniform(0.5, 1, len(det))
+    n_frames = int(gt[:, 0].max()) if len(gt) else 0
+    n_false = rng.poisson(false_positives * n_frames)
+    false = np.column_stack((rng.randint(1, n_frames + 1, n_false), np.full(n_false, -1),
+                             rng.uniform(0, width * 0.9, n_false), rng.uniform(0, height * 0.7, n_false),
+                             rng.uniform(0.03, 0.08, n_false) * width, rng.uniform(0.15, 0.35, n_false) * height,
+                             rng.uniform(0, 0.6, n_false)))
+    det = np.concatenate((det, false))
+    det[:, 2:6] = np.round(det[:, 2:6], 2)
+    return det[np.argsort(det[:, 0], kind="stable")]
+
+
+def _write_labels(path, rows):
+    """
+    Write rows (frame, id, left, top, width, height, conf) in the MOTChallenge format
+    """
+    with open(path, "w") as file:
+        for frame, id_number, x, y, w, h, conf in rows:
+            file.write("%i,%i,%.2f,%.2f,%.2f,%.2f,%.2f,-1,-1,-1\n" % (frame, id_number, x, y, w, h, conf))
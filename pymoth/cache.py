@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+"""
+On-disk cache of arrays parsed from data set files (e.g. label columns, image directory listings).
+Each entry is a directory of .npy files keyed by the source path, size, modification time and a tag,
+so an entry is invalidated as soon as its source file changes. Entries are loaded memory-mapped.
+
+get_dir()
+set_dir(directory)
+get_path(path, tag)
+load(path, tag, mmap=True)
+save(path, tag, arrays)
+clear()
+"""
+
+import hashlib
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+# Bump when the layout of cached arrays changes
+VERSION = 1
+
+_cache_dir = os.environ.get("PYMOTH_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "pymoth"))
+
+
+def get_dir():
+    """
+    :return: str: the directory in which cache entries are stored
+    """
+    return _cache_dir
+
+
+def set_dir(directory):
+    """
+    :param directory: str: the directory in which to store cache entries
+    :return: None
+    """
+    global _cache_dir
+    _cache_dir = directory
+
+
+def get_path(path, tag):
+    """
+    :param path: str: path to the source file or directory
+    :param tag: str: describes how the source was parsed (e.g. the label format)
+    :return: str: path to the cache entry for the current version of the source
+    """
+    stat = os.stat(path)
+    key = "%s|%i|%i|%s|%i" % (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, tag, VERSION)
+    return os.path.join(_cache_dir, hashlib.sha1(key.encode()).hexdigest())
+
+
+def load(path, tag, mmap=True):
+    """
+    :param path: str: path to the source file or directory
+    :param tag: str: describes how the source was parsed
+    :param mmap: bool: whether to memory-map the arrays (copy-on-write) rather than read them
+    :return: dict: name -> np.array, or None if there is no entry for the current version of the source
+    """
+    try:
+        entry = get_path(path, tag)
+        names = os.listdir(entry)
+    except OSError:
+        return None
+    mmap_mode = "c" if mmap else None
+    try:
+        return {name[:-4]: np.load(os.path.join(entry, name), mmap_mode=mmap_mode)
+                for name in names if name.endswith(".npy")}
+    except (OSError, ValueError):
+        return None
+
+
+def save(path, tag, arrays):
+    """
+    Write an entry, failing silently if the cache directory is not writable
+    :param path: str: path to the source file or directory
+    :param tag: str: describes how the source was parsed
+    :param arrays: dict: name -> np.array
+    :return: bool: whether the entry was written
+    """
+    try:
+        entry = get_path(path, tag)
+        tmp = "%s.tmp-%s" % (entry, uuid.uuid4().hex)
+        os.makedirs(tmp)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, "%s.npy" % name), np.ascontiguousarray(array))
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # Entry written concurrently by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+        return True
+    except OSError:
+        return False
+
+
+def clear():
+    """
+    Delete every cache entry
+    :return: None
+    """
+    shutil.rmtree(_cache_dir, ignore_errors=True)
@@ -1,5 +1,20 @@
 #!/usr/bin/env python3
 
+"""
+Label file formats.
+A LabelFormat declares the typed columns of a comma separated label file, parses them in a single NumPy pass, maps
+them to label store columns (bb_* columns to 'box', x/y/z to 'coordinates', others as they are) and writes them back.
+Formats are looked up by name in a registry, e.g. Sequence(file_format="MOT-gt").
+
+register_format(label_format, replace=False)
+get_format(name)
+LabelFormat(name, columns, n_columns=None, groups=None)
+"""
+
+import numpy as np
+
+from pymoth.utils import parse_labels
+
 # MOTChallenge variables and format
 mot_format = {"frame": 0,
               "id": 1,
@@ -8,3 +23,177 @@ mot_format = {"frame": 0,
               "bb_width": 4,
               "bb_height": 5,
               "conf": 6}
+
+# MOTChallenge column types
+mot_dtypes = {"frame": np.int64,
+              "id": np.int64,
+              "bb_left": np.float64,
+              "bb_top": np.float64,
+              "bb_width": np.float64,
+              "bb_height": np.float64,
+              "conf": np.float64}
+
+# Label store columns built from several file columns
+default_groups = {"box": ("bb_left", "bb_top", "bb_width", "bb_height"),
+                  "coordinates": ("x", "y", "z")}
+
+formats = {}
+
+
+class LabelFormat(object):
+
+    def __init__(self, name, columns, n_columns=None, groups=None):
+        """
+        :param name: str: name of the format in the registry
+        :param columns: list: (name, dtype) of each column, in file order, starting with 'frame' (1-based)
+        :param n_columns: int: number of columns written per line, columns after the declared ones are written as -1
+        :param groups: dict: label store column -> file columns stacked into it (default_groups if None)
+        """
+        self.name = name
+        self.columns = [(key, np.dtype(dtype)) for key, dtype in columns]
+        self.n_columns = len(self.columns) if n_columns is None else n_columns
+        groups = default_groups if groups is None else groups
+        keys = [key for key, _ in self.columns]
+        self.groups = {column: group for column, group in groups.items() if set(group) <= set(keys)}
+
+    def __repr__(self):
+        return "LabelFormat(%s, %s)" % (self.name, ", ".join(key for key, _ in self.columns))
+
+    def get_indexes(self):
+        """
+        :return: dict: column name -> column index in the file
+        """
+        return {key: i for i, (key, _) in enumerate(self.columns)}
+
+    def get_dtypes(self):
+        """
+        :return: dict: column name -> dtype
+        """
+        return {key: dtype for key, dtype in self.columns}
+
+    def get_store_columns(self):
+        """
+        :return: dict: label store column -> (dtype, shape of a single row, value used when a label is not given)
+        """
+        dtypes = self.get_dtypes()
+        grouped = {key for group in self.groups.values() for key in group}
+        columns = {column: (np.float64, (len(group),), np.nan) for column, group in self.groups.items()}
+        for key, dtype in self.columns:
+            if key != "frame" and key not in grouped:
+                columns[key] = (dtypes[key], (), -1)
+        return columns
+
+    def get_signature(self):
+        """
+        :return: str: file columns, dtypes and groups, formats with the same signature give the same label store data
+        """
+        groups = sorted((column, tuple(group)) for column, group in self.groups.items())
+        return "%s;%s" % ([(key, dtype.str) for key, dtype in self.columns], groups)
+
+    def parse(self, lines):
+        """
+        Parse label lines in a single NumPy pass
+        Columns missing from the end of the lines (e.g. a gt file without visibility) are filled with -1
+        :param lines: list: label lines (str), or a path to a label file
+        :return: dict: column name -> np.array of the column values
+        """
+        n = _count_columns(lines)
+        present = {key: i for i, (key, _) in enumerate(self.columns) if n is None or i < n}
+        labels = parse_labels(lines, present, self.get_dtypes())
+        n_rows = len(labels["frame"])
+        for key, dtype in self.columns:
+            if key not in labels:
+                labels[key] = np.full(n_rows, -1, dtype=dtype)
+        return labels
+
+    def to_store(self, labels):
+        """
+        :param labels: dict: column name -> np.array (e.g. from parse)
+        :return: (np.array, dict): 0-based frame index of each row and the label store columns
+        """
+        grouped = {key for group in self.groups.values() for key in group}
+        columns = {column: np.stack([labels[key] for key in group], axis=-1) for column, group in self.groups.items()}
+        for key, _ in self.columns:
+            if key != "frame" and key not in grouped:
+                columns[key] = labels[key]
+        return labels["frame"] - 1, columns
+
+    def from_store(self, data):
+        """
+        :param data: dict: label store columns, including 'frame' (e.g. from LabelStore.get_data)
+        :return: dict: column name -> np.array of the column values
+        """
+        labels = {"frame": data["frame"] + 1}
+        for column, group in self.groups.items():
+            for i, key in enumerate(group):
+                labels[key] = data[column][:, i]
+        for key, dtype in self.columns:
+            if key not in labels:
+                labels[key] = data[key] if key in data else np.full(len(data["frame"]), -1, dtype=dtype)
+        return labels
+
+    def write(self, file_path, labels):
+        """
+        Write label columns in a single NumPy pass, rows in the order given
+        :param file_path: str: path to the label file
+        :param labels: dict: column name -> np.array (e.g. from parse or from_store)
+        :return: None
+        """
+        n_rows = len(labels["frame"])
+        table = np.full((n_rows, self.n_columns), -1, dtype=np.float64)
+        formats = []
+        for i, (key, dtype) in enumerate(self.columns):
+            table[:, i] = labels[key]
+            formats.append("%d" if np.issubdtype(dtype, np.integer) else "%.10g")
+        formats += ["%d"] * (self.n_columns - len(self.columns))
+        np.savetxt(file_path, table, fmt=formats, delimiter=",")
+
+
+def register_format(label_format, replace=False):
+    """
+    :param label_format: LabelFormat: the format to register under its name
+    :param replace: bool: whether to replace a format already registered under the same name
+    :return: LabelFormat: the format
+    """
+    if label_format.name in formats and not replace:
+        raise ValueError("file format %s is already registered" % label_format.name)
+    formats[label_format.name] = label_format
+    return label_format
+
+
+def get_format(name):
+    """
+    :param name: str: name of a registered format (or a LabelFormat, returned as it is)
+    :return: LabelFormat: the format
+    """
+    if isinstance(name, LabelFormat):
+        return name
+    if name not in formats:
+        raise ValueError("unknown file format %s" % name)
+    return formats[name]
+
+
+def _count_columns(lines):
+    """
+    :param lines: list: label lines (str), or a path to a label file
+    :return: int: number of columns of the first line (None if there are no lines)
+    """
+    if isinstance(lines, str):
+        with open(lines, "r") as file:
+            lines = (line for line in file if line.strip())
+            first = next(lines, None)
+    else:
+        first = next((line for line in lines if line.strip()), None)
+    return None if first is None else first.count(",") + 1
+
+
+_mot_columns = [(key, mot_dtypes[key]) for key in sorted(mot_format, key=mot_format.get)]
+
+# First seven columns of any MOTChallenge file (the default format)
+register_format(LabelFormat("MOT", _mot_columns, n_columns=10))
+# Detections: frame, -1, box, conf, -1, -1, -1
+register_format(LabelFormat("MOT-det", _mot_columns, n_columns=10))
+# MOT16 / MOT17 / MOT20 ground truth: frame, id, box, conf (0 to ignore), class, visibility
+register_format(LabelFormat("MOT-gt", _mot_columns + [("class", np.int64), ("visibility", np.float64)]))
+# MOT15 3D (and 2D with world coordinates): frame, id, box, conf, x, y, z
+register_format(LabelFormat("MOT-3D", _mot_columns + [("x", np.float64), ("y", np.float64), ("z", np.float64)]))
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+
+"""
+Tracking metrics comparing a hypothesis Sequence (tracker output) with a ground truth Sequence.
+
+clear_mot(gt, hyp, threshold=0.5, ignore_zero_conf=True)
+idf1(gt, hyp, threshold=0.5, ignore_zero_conf=True)
+hota(gt, hyp, ignore_zero_conf=True)
+evaluate(gt, hyp, threshold=0.5, ignore_zero_conf=True)
+combine(results)
+"""
+
+import numpy as np
+
+from pymoth.utils import batch_iou2
+from pymoth.utils import linear_assignment
+
+# Summed over sequences by combine(), every other metric is derived from these
+clear_mot_counts = ("gt", "hyp", "matches", "FP", "FN", "IDSW", "iou_sum", "MT", "PT", "ML", "Frag", "gt_ids")
+idf1_counts = ("IDTP", "IDFP", "IDFN")
+
+# Localisation thresholds over which HOTA is averaged
+hota_alphas = np.arange(0.05, 0.99, 0.05)
+
+# MOTChallenge gt classes: only pedestrians are scored, hypotheses matching a distractor (person on vehicle,
+# non motorized vehicle, static person, distractor, reflection) are removed rather than counted as false positives
+pedestrian_class = 1
+distractor_classes = (2, 6, 7, 8, 12)
+
+# Minimum iou of a hypothesis and a distractor or ignored gt instance for the hypothesis to be removed
+distractor_threshold = 0.5
+
+
+def clear_mot(gt, hyp, threshold=0.5, ignore_zero_conf=True):
+    """
+    CLEAR-MOT metrics of a hypothesis sequence against a ground truth sequence
+    In each frame, gt and hyp instances are matched by maximum total iou (pairs below threshold are never matched),
+    with matches that continue the previous correspondence of a gt id taking priority, as in the MOTChallenge toolkit
+    gt and hyp instances are first filtered as in the MOTChallenge toolkit if ignore_zero_conf (see _match_frames)
+    :param gt: Sequence: ground truth
+    :param hyp: Sequence: hypotheses (tracker output)
+    :param threshold: float: minimum iou of a match
+    :param ignore_zero_conf: bool: whether to ignore gt instances with conf 0 (not considered in MOTChallenge gt), and
+    if gt has a class column (MOT-gt format) non-pedestrian gt and the hypotheses matching distractors
+    :return: dict: MOTA, MOTP, Recall, Precision and the counts in clear_mot_counts
+    """
+    frames, n_gt_ids, _ = _match_frames(gt, hyp, ignore_zero_conf=ignore_zero_conf)
+    return _clear_mot(frames, n_gt_ids, threshold=threshold)
+
+
+def idf1(gt, hyp, threshold=0.5, ignore_zero_conf=True):
+    """
+    Identity metrics (IDF1, IDP, IDR) of a hypothesis sequence against a ground truth sequence
+    Each gt id is matched to at most one hyp id over the whole sequence (global bipartite matching), maximising the
+    number of frames in which matched ids overlap with an iou of at least threshold
+    :param gt: Sequence: ground truth
+    :param hyp: Sequence: hypotheses (tracker output)
+    :param threshold: float: minimum iou for a gt and hyp instance to count as the same target
+    :param ignore_zero_conf: bool: whether to ignore gt instances with conf 0 (and distractors, see clear_mot)
+    :return: dict: IDF1, IDP, IDR and the counts in idf1_counts
+    """
+    frames, _, n_hyp_ids = _match_frames(gt, hyp, ignore_zero_conf=ignore_zero_conf)
+    return _idf1(frames, n_hyp_ids, threshold=threshold)
+
+
+def hota(gt, hyp, ignore_zero_conf=True):
+    """
+    HOTA metrics of a hypothesis sequence against a ground truth sequence, averaged over hota_alphas
+    Instances are matched once per frame and every alpha threshold is scored from the same matches,
+    association scores being computed from sparse tables of gt id x hyp id match counts
+    :param gt: Sequence: ground truth
+    :param hyp: Sequence: hypotheses (tracker output)
+    :param ignore_zero_conf: bool: whether to ignore gt instances with conf 0 (and distractors, see clear_mot)
+    :return: dict: HOTA, DetA, AssA, DetRe, DetPr, AssRe, AssPr, LocA and their values at each alpha
+    """
+    frames, n_gt_ids, n_hyp_ids = _match_frames(gt, hyp, ignore_zero_conf=ignore_zero_conf)
+    return _hota(frames, n_gt_ids, n_hyp_ids)
+
+
+def evaluate(gt, hyp, threshold=0.5, ignore_zero_conf=True):
+    """
+    CLEAR-MOT, identity and HOTA metrics from a single iou pass
+    :param gt: Sequence: ground truth
+    :param hyp: Sequence: hypotheses (tracker output)
+    :param threshold: float: minimum iou of a match for CLEAR-MOT and identity metrics
+    :param ignore_zero_conf: bool: whether to ignore gt instances with conf 0 (and distractors, see clear_mot)
+    :return: dict: every metric returned by clear_mot, idf1 and hota
+    """
+    frames, n_gt_ids, n_hyp_ids = _match_frames(gt, hyp, ignore_zero_conf=ignore_zero_conf)
+    metrics = _clear_mot(frames, n_gt_ids, threshold=threshold)
+    metrics.update(_idf1(frames, n_hyp_ids, threshold=threshold))
+    metrics.update(_hota(frames, n_gt_ids, n_hyp_ids))
+    return metrics
+
+
+def combine(results):
+    """
+    Combine the results of several sequences (e.g. a whole benchmark split)
+    :param results: list: dicts returned by clear_mot, idf1, hota or evaluate
+    :return: dict: metrics computed over the summed counts
+    """
+    metrics = {}
+    if all(key in results[0] for key in clear_mot_counts):
+        metrics.update(_clear_mot_metrics({key: sum(result[key] for result in results) for key in clear_mot_counts}))
+    if all(key in results[0] for key in idf1_counts):
+        metrics.update(_idf1_metrics({key: sum(result[key] for result in results) for key in idf1_counts}))
+    if "HOTA_TP" in results[0]:
+        counts = {key: sum(result[key] for result in results) for key in ("HOTA_TP", "HOTA_FN", "HOTA_FP")}
+        for key in ("AssA_alpha", "AssRe_alpha", "AssPr_alpha", "LocA_alpha"):
+            weighted = sum(result[key] * result["HOTA_TP"] for result in results)
+            counts[key] = weighted / np.maximum(1e-10, counts["HOTA_TP"])
+        metrics.update(_hota_metrics(counts))
+    return metrics
+
+
+def _clear_mot(frames, n_gt_ids, threshold=0.5):
+    """
+    :param frames: list: (gt_ids, hyp_ids, iou) of each frame, from _match_frames
+    :param n_gt_ids: int: number of gt ids
+    :param threshold: float: minimum iou of a match
+    :return: dict: CLEAR-MOT metrics
+    """
+    last_hyp = np.full(n_gt_ids, -1, dtype=np.int64)                    # Hyp id last matched to each gt id
+    last_tracked = np.zeros(n_gt_ids, dtype=bool)                       # Whether the gt id was matched when last seen
+    n_present = np.zeros(n_gt_ids, dtype=np.int64)
+    n_tracked = np.zeros(n_gt_ids, dtype=np.int64)
+    n_starts = np.zeros(n_gt_ids, dtype=np.int64)
+    counts = dict.fromkeys(clear_mot_counts, 0)
+    for gt_ids, hyp_ids, iou in frames:
+        counts["gt"] += len(gt_ids)
+        counts["hyp"] += len(hyp_ids)
+        np.add.at(n_present, gt_ids, 1)
+        tracked = np.zeros(len(gt_ids), dtype=bool)
+        if len(gt_ids) and len(hyp_ids):
+            score = np.where(iou >= threshold, iou, 0)
+            score += 1000 * ((last_hyp[gt_ids][:, None] == hyp_ids[None, :]) & (score > 0))
+            rows, cols = linear_assignment(-score)
+            keep = score[rows, cols] > 0
+            rows, cols = rows[keep], cols[keep]
+            matched_gt, matched_hyp = gt_ids[rows], hyp_ids[cols]
+            counts["IDSW"] += int(np.count_nonzero((last_hyp[matched_gt] != -1) & (last_hyp[matched_gt] != matched_hyp)))
+            counts["matches"] += len(rows)
+            counts["iou_sum"] += float(iou[rows, cols].sum())
+            last_hyp[matched_gt] = matched_hyp
+            np.add.at(n_tracked, matched_gt, 1)
+            tracked[rows] = True
+        np.add.at(n_starts, gt_ids[tracked & ~last_tracked[gt_ids]], 1)
+        last_tracked[gt_ids] = tracked
+    seen = n_present > 0
+    ratio = n_tracked[seen] / n_present[seen]
+    counts["FP"] = counts["hyp"] - counts["matches"]
+    counts["FN"] = counts["gt"] - counts["matches"]
+    counts["MT"] = int(np.count_nonzero(ratio > 0.8))                   # Strictly more than 80%, as in the toolkits
+    counts["ML"] = int(np.count_nonzero(ratio < 0.2))
+    counts["PT"] = int(np.count_nonzero(seen)) - counts["MT"] - counts["ML"]
+    counts["Frag"] = int(np.clip(n_starts - 1, 0, None).sum())
+    counts["gt_ids"] = int(np.count_nonzero(seen))
+    return _clear_mot_metrics(counts)
+
+
+def _clear_mot_metrics(counts):
+    """
+    :param counts: dict: the counts in clear_mot_counts
+    :return: dict: the counts with MOTA, MOTP, Recall and Precision added
+    """
+    metrics = dict(counts)
+    metrics["MOTA"] = 1 - (counts["FN"] + counts["FP"] + counts["IDSW"]) / max(1, counts["gt"])
+    metrics["MOTP"] = counts["iou_sum"] / max(1, counts["matches"])
+    metrics["Recall"] = counts["matches"] / max(1, counts["gt"])
+    metrics["Precision"] = counts["matches"] / max(1, counts["hyp"])
+    return metrics
+
+
+def _idf1(frames, n_hyp_ids, threshold=0.5):
+    """
+    :param frames: list: (gt_ids, hyp_ids, iou) of each frame, from _match_frames
+    :param n_hyp_ids: int: number of hyp ids
+    :param threshold: float: minimum iou for a gt and hyp instance to count as the same target
+    :return: dict: identity metrics
+    """
+    # Sparse table of the number of frames in which each (gt id, hyp id) pair overlaps
+    keys = [np.empty(0, dtype=np.int64)]
+    n_gt, n_hyp = 0, 0
+    for gt_ids, hyp_ids, iou in frames:
+        n_gt += len(gt_ids)
+        n_hyp += len(hyp_ids)
+        rows, cols = np.nonzero(iou >= threshold)
+        keys.append(gt_ids[rows] * n_hyp_ids + hyp_ids[cols])
+    keys, overlaps = np.unique(np.concatenate(keys), return_counts=True)
+    # Global matching of gt ids to hyp ids over the ids that overlap at all
+    _, gt_index = np.unique(keys // max(1, n_hyp_ids), return_inverse=True)
+    _, hyp_index = np.unique(keys % max(1, n_hyp_ids), return_inverse=True)
+    table = np.zeros((gt_index.max(initial=-1) + 1, hyp_index.max(initial=-1) + 1))
+    table[gt_index, hyp_index] = overlaps
+    rows, cols = linear_assignment(-table)
+    idtp = int(table[rows, cols].sum())
+    return _idf1_metrics({"IDTP": idtp, "IDFP": n_hyp - idtp, "IDFN": n_gt - idtp})
+
+
+def _idf1_metrics(counts):
+    """
+    :param counts: dict: the counts in idf1_counts
+    :return: dict: the counts with IDF1, IDP and IDR added
+    """
+    metrics = dict(counts)
+    metrics["IDP"] = counts["IDTP"] / max(1, counts["IDTP"] + counts["IDFP"])
+    metrics["IDR"] = counts["IDTP"] / max(1, counts["IDTP"] + counts["IDFN"])
+    metrics["IDF1"] = 2 * counts["IDTP"] / max(1, 2 * counts["IDTP"] + counts["IDFP"] + counts["IDFN"])
+    return metrics
+
+
+def _hota(frames, n_gt_ids, n_hyp_ids):
+    """
+    :param frames: list: (gt_ids, hyp_ids, iou) of each frame, from _match_frames
+    :param n_gt_ids: int: number of gt ids
+    :param n_hyp_ids: int: number of hyp ids
+    :return: dict: HOTA metrics
+    """
+    eps = np.finfo(np.float64).eps
+    gt_id_count = np.zeros(n_gt_ids)
+    hyp_id_count = np.zeros(n_hyp_ids)
+    # Sparse table of how strongly each (gt id, hyp id) pair overlaps over the sequence
+    keys, values = [np.empty(0, dtype=np.int64)], [np.empty(0)]
+    for gt_ids, hyp_ids, iou in frames:
+        np.add.at(gt_id_count, gt_ids, 1)
+        np.add.at(hyp_id_count, hyp_ids, 1)
+        if iou.size:
+            denominator = iou.sum(axis=0)[None, :] + iou.sum(axis=1)[:, None] - iou
+            iou = np.divide(iou, denominator, out=np.zeros_like(iou), where=denominator > eps)
+            rows, cols = np.nonzero(iou)
+            keys.append(gt_ids[rows] * n_hyp_ids + hyp_ids[cols])
+            values.append(iou[rows, cols])
+    pair_keys, index = np.unique(np.concatenate(keys), return_inverse=True)
+    potential = np.bincount(index, weights=np.concatenate(values), minlength=len(pair_keys))
+    alignment = potential / (gt_id_count[pair_keys // max(1, n_hyp_ids)] +
+                             hyp_id_count[pair_keys % max(1, n_hyp_ids)] - potential)
+    # Match each frame once, weighting iou by how well the pair is aligned over the sequence
+    keys, similarities = [np.empty(0, dtype=np.int64)], [np.empty(0)]
+    n_gt, n_hyp = 0, 0
+    for gt_ids, hyp_ids, iou in frames:
+        n_gt += len(gt_ids)
+        n_hyp += len(hyp_ids)
+        if iou.any():
+            frame_keys = gt_ids[:, None] * n_hyp_ids + hyp_ids[None, :]
+            i = np.minimum(np.searchsorted(pair_keys, frame_keys), len(pair_keys) - 1)
+            score = np.where(pair_keys[i] == frame_keys, alignment[i], 0) * iou
+            rows, cols = linear_assignment(-score)
+            keys.append(frame_keys[rows, cols])
+            similarities.append(iou[rows, cols])
+    match_keys, index = np.unique(np.concatenate(keys), return_inverse=True)
+    similarities = np.concatenate(similarities)
+    gt_counts = gt_id_count[match_keys // max(1, n_hyp_ids)]
+    hyp_counts = hyp_id_count[match_keys % max(1, n_hyp_ids)]
+    # Score every alpha from the same matches
+    counts = {key: np.zeros(len(hota_alphas)) for key in ("HOTA_TP", "HOTA_FN", "HOTA_FP", "AssA_alpha",
+                                                          "AssRe_alpha", "AssPr_alpha", "LocA_alpha")}
+    for a, alpha in enumerate(hota_alphas):
+        matched = similarities >= alpha - eps
+        tp = np.count_nonzero(matched)
+        matches = np.bincount(index[matched], minlength=len(match_keys))
+        counts["HOTA_TP"][a] = tp
+        counts["HOTA_FN"][a] = n_gt - tp
+        counts["HOTA_FP"][a] = n_hyp - tp
+        counts["AssA_alpha"][a] = np.sum(matches ** 2 / np.maximum(1, gt_counts + hyp_counts - matches)) / max(1, tp)
+        counts["AssRe_alpha"][a] = np.sum(matches ** 2 / np.maximum(1, gt_counts)) / max(1, tp)
+        counts["AssPr_alpha"][a] = np.sum(matches ** 2 / np.maximum(1, hyp_counts)) / max(1, tp)
+        counts["LocA_alpha"][a] = max(1e-10, similarities[matched].sum()) / max(1e-10, tp)
+    return _hota_metrics(counts)
+
+
+def _hota_metrics(counts):
+    """
+    :param counts: dict: per-alpha HOTA_TP, HOTA_FN, HOTA_FP, AssA_alpha, AssRe_alpha, AssPr_alpha and LocA_alpha
+    :return: dict: the counts with HOTA, DetA, AssA, DetRe, DetPr, AssRe, AssPr and LocA (means over alphas) added
+    """
+    metrics = dict(counts)
+    tp, fn, fp = counts["HOTA_TP"], counts["HOTA_FN"], counts["HOTA_FP"]
+    metrics["DetRe_alpha"] = tp / np.maximum(1, tp + fn)
+    metrics["DetPr_alpha"] = tp / np.maximum(1, tp + fp)
+    metrics["DetA_alpha"] = tp / np.maximum(1, tp + fn + fp)
+    metrics["HOTA_alpha"] = np.sqrt(metrics["DetA_alpha"] * counts["AssA_alpha"])
+    for key in ("HOTA", "DetA", "AssA", "DetRe", "DetPr", "AssRe", "AssPr", "LocA"):
+        metrics[key] = float(np.mean(metrics["%s_alpha" % key]))
+    return metrics
+
+
+def _match_frames(gt, hyp, ignore_zero_conf=True):
+    """
+    Per-frame gt ids, hyp ids and iou matrices, from a single batched iou pass over both sequences
+    Ids are renumbered 0..n-1 so they can index arrays
+    If ignore_zero_conf, gt instances with conf 0 are dropped. If gt also has a class column (MOT-gt format), the
+    MOTChallenge preprocessing is applied: in each frame, hypotheses are matched to every gt instance (maximum total iou
+    of at least distractor_threshold), those matched to a distractor class or conf 0 gt instance are dropped, and only
+    gt instances of pedestrian_class are kept
+    :param gt: Sequence: ground truth
+    :param hyp: Sequence: hypotheses
+    :param ignore_zero_conf: bool: whether to drop gt instances with conf 0 (and distractors)
+    :return: (list, int, int): (gt_ids, hyp_ids, iou) of each frame, the number of gt ids and of hyp ids
+    """
+    n_frames = max(gt.get_n_frames(), hyp.get_n_frames())
+    gt_ids, gt_rects, gt_offsets = _columns(gt, n_frames)
+    hyp_ids, hyp_rects, hyp_offsets = _columns(hyp, n_frames)
+    ious = batch_iou2(gt_rects, gt_offsets, hyp_rects, hyp_offsets, sparse=True)
+    gt_keep = np.ones(len(gt_ids), dtype=bool)
+    hyp_keep = np.ones(len(hyp_ids), dtype=bool)
+    if ignore_zero_conf:
+        gt_keep = gt.get_conf() != 0
+        if "class" in gt.store.columns:
+            classes = gt.store.get("class")
+            ignored = ~gt_keep | np.isin(classes, distractor_classes)
+            hyp_keep = ~_distractor_matches(ignored, gt.store.get("frame"), ious, gt_offsets, hyp_offsets)
+            gt_keep &= classes == pedestrian_class
+    gt_unique, gt_ids = np.unique(gt_ids[gt_keep], return_inverse=True)
+    hyp_unique, hyp_ids = np.unique(hyp_ids[hyp_keep], return_inverse=True)
+    gt_kept = np.concatenate(([0], np.cumsum(gt_keep)))[gt_offsets]    # Offsets of the kept instances
+    hyp_kept = np.concatenate(([0], np.cumsum(hyp_keep)))[hyp_offsets]
+    frames = []
+    for f in range(n_frames):
+        iou = ious[f]
+        rows = gt_keep[gt_offsets[f]:gt_offsets[f + 1]]
+        cols = hyp_keep[hyp_offsets[f]:hyp_offsets[f + 1]]
+        if not (rows.all() and cols.all()):
+            iou = iou[rows][:, cols]
+        frames.append((gt_ids[gt_kept[f]:gt_kept[f + 1]], hyp_ids[hyp_kept[f]:hyp_kept[f + 1]], iou))
+    return frames, len(gt_unique), len(hyp_unique)
+
+
+def _distractor_matches(ignored, gt_frames, ious, gt_offsets, hyp_offsets):
+    """
+    :param ignored: np.array: whether each gt instance is a distractor (or otherwise ignored)
+    :param gt_frames: np.array: frame index of each gt instance
+    :param ious: list: gt x hyp iou matrix of each frame
+    :param gt_offsets: np.array: per-frame offsets of gt instances
+    :param hyp_offsets: np.array: per-frame offsets of hyp instances
+    :return: np.array: whether each hyp instance is matched to an ignored gt instance
+    """
+    eps = np.finfo(np.float64).eps
+    matched = np.zeros(hyp_offsets[-1], dtype=bool)
+    for f in np.unique(gt_frames[ignored]).tolist():
+        iou = ious[f]
+        if not iou.any():
+            continue
+        score = np.where(iou >= distractor_threshold - eps, iou, 0)
+        rows, cols = linear_assignment(-score)
+        keep = score[rows, cols] > eps
+        rows, cols = rows[keep], cols[keep]
+        distractor = ignored[gt_offsets[f] + rows]
+        matched[hyp_offsets[f] + cols[distractor]] = True
+    return matched
+
+
+def _columns(sequence, n_frames):
+    """
+    :param sequence: Sequence
+    :param n_frames: int: number of frames to compute offsets for
+    :return: (np.array, np.array, np.array): ids, rects and per-frame offsets of the instances
+    """
+    frames = sequence.store.get("frame")
+    offsets = np.searchsorted(frames, np.arange(n_frames + 1))
+    return sequence.get_ids().reshape(-1), sequence.get_rects(), offsets
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+"""
+Opt-in instrumentation of pymoth hot paths (label parsing, image decoding, cropping and resizing, iou, matching,
+drawing). Instrumented code records counters and timings only while a collect() block is open or a hook is installed,
+otherwise each instrumented call costs a single flag check.
+
+collect()
+add_hook(hook)
+remove_hook(hook)
+is_enabled()
+timed(name)
+start()
+stop(name, start_time)
+count(name, n=1)
+Report()
+"""
+
+import contextlib
+import functools
+import math
+import threading
+import time
+
+# Upper bounds (seconds) of the timing histogram buckets, powers of 2 from ~1 us to ~137 s
+buckets = tuple(2. ** k for k in range(-20, 8))
+
+_enabled = False
+_reports = []                                                           # Reports of the open collect() blocks
+_hooks = []
+_lock = threading.Lock()
+
+
+class Report(object):
+
+    def __init__(self):
+        self.counters = {}                                              # Name -> count
+        self.timings = {}                                               # Name -> [n, total, min, max, bucket counts]
+
+    def add_count(self, name, n):
+        """
+        :param name: str: name of the counter
+        :param n: int: value to add
+        :return: None
+        """
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name, seconds):
+        """
+        :param name: str: name of the timing
+        :param seconds: float: duration of one call
+        :return: None
+        """
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = [0, 0., math.inf, 0., [0] * (len(buckets) + 1)]
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2] = min(timing[2], seconds)
+        timing[3] = max(timing[3], seconds)
+        timing[4][_bucket(seconds)] += 1
+
+    def get_counters(self):
+        """
+        :return: dict: name -> count
+        """
+        return dict(self.counters)
+
+    def get_timings(self):
+        """
+        :return: dict: name -> dict of count, total, mean, min, max, p50, p90 and p99 (in seconds)
+        Percentiles are upper bounds of the histogram bucket they fall in (within a factor of 2)
+        """
+        timings = {}
+        for name, (n, total, minimum, maximum, counts) in self.timings.items():
+            timings[name] = {"count": n, "total": total, "mean": total / n, "min": minimum, "max": maximum,
+                             "p50": _percentile(counts, n, 0.5, maximum),
+                             "p90": _percentile(counts, n, 0.9, maximum),
+                             "p99": _percentile(counts, n, 0.99, maximum),
+                             "histogram": list(counts)}
+        return timings
+
+    def to_dict(self):
+        """
+        :return: dict: 'counters' and 'timings' (e.g. to dump as JSON)
+        """
+        return {"counters": self.get_counters(), "timings": self.get_timings()}
+
+    def summary(self):
+        """
+        :return: str: a table of timings (sorted by total time) and counters
+        """
+        lines = ["%-32s %8s %10s %10s %10s %10s" % ("timing", "count", "total (s)", "mean (ms)", "p90 (ms)",
+                                                    "max (ms)")]
+        timings = sorted(self.get_timings().items(), key=lambda item: -item[1]["total"])
+        for name, timing in timings:
+            lines.append("%-32s %8i %10.4f %10.3f %10.3f %10.3f" % (name, timing["count"], timing["total"],
+                                                                     1e3 * timing["mean"], 1e3 * timing["p90"],
+                                                                     1e3 * timing["max"]))
+        if self.counters:
+            lines.append("")
+            lines.append("%-32s %8s" % ("counter", "count"))
+            for name, n in sorted(self.counters.items()):
+                lines.append("%-32s %8i" % (name, n))
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def collect():
+    """
+    Record counters and timings of every instrumented call made (by any thread) while the block is open
+    :return: Report: the report the records are added to
+    """
+    report = Report()
+    with _lock:
+        _reports.append(report)
+        _update()
+    try:
+        yield report
+    finally:
+        with _lock:
+            _reports.remove(report)
+            _update()
+
+
+def add_hook(hook):
+    """
+    Forward records to a monitoring system, instrumentation stays enabled while a hook is installed
+    :param hook: function: called as hook(kind, name, value), kind being 'count' (value: int) or 'time' (value: seconds)
+    :return: function: the hook
+    """
+    with _lock:
+        _hooks.append(hook)
+        _update()
+    return hook
+
+
+def remove_hook(hook):
+    """
+    :param hook: function: an installed hook
+    :return: None
+    """
+    with _lock:
+        _hooks.remove(hook)
+        _update()
+
+
+def is_enabled():
+    """
+    :return: bool: whether instrumented calls are being recorded
+    """
+    return _enabled
+
+
+def timed(name):
+    """
+    Decorator recording the duration of each call of a function under name
+    :param name: str: name of the timing
+    :return: function: the decorator
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record("time", name, time.perf_counter() - start_time)
+        return wrapper
+    return decorator
+
+
+def start():
+    """
+    Start timing a section of code, to be ended with stop
+    :return: float: the start time, or None if instrumentation is disabled
+    """
+    return time.perf_counter() if _enabled else None
+
+
+def stop(name, start_time):
+    """
+    :param name: str: name of the timing
+    :param start_time: float: value returned by start
+    :return: None
+    """
+    if start_time is not None:
+        _record("time", name, time.perf_counter() - start_time)
+
+
+def count(name, n=1):
+    """
+    :param name: str: name of the counter
+    :param n: int: value to add
+    :return: None
+    """
+    if _enabled:
+        _record("count", name, n)
+
+
+def _record(kind, name, value):
+    with _lock:
+        for report in _reports:
+            if kind == "time":
+                report.add_time(name, value)
+            else:
+                report.add_count(name, value)
+        hooks = list(_hooks)
+    for hook in hooks:
+        hook(kind, name, value)
+
+
+def _update():
+    global _enabled
+    _enabled = bool(_reports or _hooks)
+
+
+def _bucket(seconds):
+    """
+    :return: int: index of the histogram bucket of a duration (len(buckets) for durations above the last bound)
+    """
+    if seconds <= buckets[0]:
+        return 0
+    return min(len(buckets), math.ceil(math.log2(seconds)) + 20)
+
+
+def _percentile(counts, n, q, maximum):
+    """
+    :return: float: upper bound of the bucket holding the q quantile (capped by the maximum duration)
+    """
+    rank = q * n
+    total = 0
+    for i, bucket_count in enumerate(counts):
+        total += bucket_count
+        if total >= rank:
+            return min(maximum, buckets[i]) if i < len(buckets) else maximum
+    return maximum
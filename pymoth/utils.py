@@ -2,27 +2,47 @@
 
 import collections
 import cv2
+import functools
 import numpy as np
 import sys
+import threading
 import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 
 
+from pymoth import profiling
 from pymoth.Namespace import Namespace
+from pymoth.SpatialIndex import SpatialIndex
 
 """
 chunks(l, n)
 get_shifty(array, shift=1)
 convert(string)
 load_info(file_path)
+parse_labels(lines, file_format, dtypes=None)
 resize(image, shape, keep_aspect=True, padding=0)
+resize_into(image, out, keep_aspect=True, padding=0, scratch=None)
+resize_batch(images, shape, keep_aspect=True, padding=0, out=None, scratch=None)
+crop_batch(image, rects, shape, keep_aspect=True, padding=0, out=None, scratch=None)
 pad(image, shape, value=0)
+extract_crops(img_paths, frames, rects, shape=None, keep_aspect=True, out=None, workers=4, verbose=0)
+id2color(id_number)
 box2rect(box)
 rect2box(rect)
 box2xywh(box)
-iou(rects)
-iou2(rects1, rects2)
+iou(rects, chunk_size=None)
+iou2(rects1, rects2, chunk_size=None, sparse=False)
+batch_iou2(rects1, offsets1, rects2, offsets2, chunk_size=None, sparse=False)
+overlap_pairs(rects1, rects2)
 nms(array, by_row=True, by_col=True, threshold=0)
+linear_assignment(cost)
+greedy_assignment(array, threshold=0)
+match(array, threshold=0.5, method="hungarian")
 Progbar(target, width=30, verbose=1, interval=0.05, stateful_metrics=None)
+ImageCache(max_bytes=268435456)
+imread(path)
 """
 
 
@@ -75,6 +95,25 @@ def load_info(file_path):
     return info
 
 
+@profiling.timed("utils.parse_labels")
+def parse_labels(lines, file_format, dtypes=None):
+    """
+    Parse comma separated label lines in a single NumPy pass
+    :param lines: list: label lines (str), or a path to a label file
+    :param file_format: dict: column name -> column index in the file
+    :param dtypes: dict: column name -> dtype (float64 if not given)
+    :return: dict: column name -> np.array of the column values
+    """
+    dtypes = {} if dtypes is None else dtypes
+    keys = list(file_format)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)                    # Raised for empty label files
+        data = np.loadtxt(lines, delimiter=",", usecols=[file_format[key] for key in keys],
+                          dtype=np.float64, ndmin=2)
+    return {key: data[:, i].astype(dtypes.get(key, np.float64)) for i, key in enumerate(keys)}
+
+
+@profiling.timed("utils.resize")
 def resize(image, shape, keep_aspect=True, padding=0):
     """
     Author: Samuel Westlake and Alix Leroy
@@ -84,20 +123,93 @@ def resize(image, shape, keep_aspect=True, padding=0):
     :param padding: int, value for padding if keep_aspect is True
     :return: np.array, image of size shape
     """
-    if image.shape[0]*image.shape[1] > shape[0]*shape[1]:
+    shape = tuple(shape[0:2]) + tuple(image.shape[2:])
+    return resize_into(image, np.empty(shape, dtype=image.dtype), keep_aspect=keep_aspect, padding=padding)
+
+
+@profiling.timed("utils.resize_into")
+def resize_into(image, out, keep_aspect=True, padding=0, scratch=None):
+    """
+    Resize an image directly into an output array, letterboxed (centred and padded) if keep_aspect
+    Nothing is allocated if out has the dtype of image, otherwise the image is resized into scratch then cast into out
+    :param image: np.array: input image
+    :param out: np.array: output array, of the target shape
+    :param keep_aspect: bool: whether to keep the aspect ratio of the image
+    :param padding: int: value of the padding around the letterboxed image
+    :param scratch: np.array: array of the shape of out and dtype of image (allocated if needed and None)
+    :return: np.array: out
+    """
+    if out.dtype != image.dtype:
+        if scratch is None or scratch.shape != out.shape or scratch.dtype != image.dtype:
+            scratch = np.empty(out.shape, dtype=image.dtype)
+        resize_into(image, scratch, keep_aspect=keep_aspect, padding=padding)
+        np.copyto(out, scratch, casting="unsafe")
+        return out
+    if image.size == 0:
+        out[...] = padding
+        return out
+    if image.shape[0] * image.shape[1] > out.shape[0] * out.shape[1]:
         interpolation = cv2.INTER_LINEAR_EXACT                          # Use the Bilinear Interpolation
     else:
         interpolation = cv2.INTER_CUBIC                                 # Use the Bicubic interpolation
-    if keep_aspect:
-        scale = min(np.asarray(shape[0:2]) / np.asarray(image.shape[0:2]))
-        new_size = np.array(image.shape[0:2]) * scale
-        image = cv2.resize(image, (int(new_size[1]), int(new_size[0])), interpolation=interpolation)
-        image = pad(image, shape, padding)
-    else:
-        image = cv2.resize(image, (shape[0], shape[1]), interpolation=interpolation)
-    return image
+    if not keep_aspect:
+        cv2.resize(image, (out.shape[1], out.shape[0]), dst=out, interpolation=interpolation)
+        return out
+    scale = min(out.shape[0] / image.shape[0], out.shape[1] / image.shape[1])
+    h = min(out.shape[0], max(1, int(image.shape[0] * scale)))
+    w = min(out.shape[1], max(1, int(image.shape[1] * scale)))
+    y0 = int((out.shape[0] - h) / 2)
+    x0 = int((out.shape[1] - w) / 2)
+    # Only the border around the resized image is padded
+    out[:y0] = padding
+    out[y0 + h:] = padding
+    out[y0:y0 + h, :x0] = padding
+    out[y0:y0 + h, x0 + w:] = padding
+    cv2.resize(image, (w, h), dst=out[y0:y0 + h, x0:x0 + w], interpolation=interpolation)
+    return out
+
+
+@profiling.timed("utils.resize_batch")
+def resize_batch(images, shape, keep_aspect=True, padding=0, out=None, scratch=None):
+    """
+    Resize a batch of images into one array
+    :param images: list: images (e.g. crops of different sizes)
+    :param shape: tuple: shape of each output image
+    :param keep_aspect: bool: whether to keep the aspect ratio of the images
+    :param padding: int: value of the padding around letterboxed images
+    :param out: np.array: array of shape (len(images),) + shape to write into (uint8, allocated if None)
+    :param scratch: np.array: reusable buffer, see resize_into
+    :return: np.array: out
+    """
+    if out is None:
+        out = np.empty((len(images),) + tuple(shape), dtype=np.uint8)
+    for i, image in enumerate(images):
+        if out.dtype != image.dtype and (scratch is None or scratch.dtype != image.dtype):
+            scratch = np.empty(out.shape[1:], dtype=image.dtype)
+        resize_into(image, out[i], keep_aspect=keep_aspect, padding=padding, scratch=scratch)
+    return out
+
 
+@profiling.timed("utils.crop_batch")
+def crop_batch(image, rects, shape, keep_aspect=True, padding=0, out=None, scratch=None):
+    """
+    Crop rects from an image and resize each crop directly into one array
+    :param image: np.array: the image to crop
+    :param rects: np.array: 2D array of rects (x1, y1, x2, y2), clipped at 0
+    :param shape: tuple: shape of each crop
+    :param keep_aspect: bool: whether to keep the aspect ratio of the crops
+    :param padding: int: value of the padding around letterboxed crops
+    :param out: np.array: array of shape (len(rects),) + shape to write into (uint8, allocated if None)
+    :param scratch: np.array: reusable buffer, see resize_into
+    :return: np.array: out
+    """
+    rects = np.asarray(rects).reshape(-1, 4).astype(int)
+    rects[rects < 0] = 0
+    return resize_batch([image[y0:y1, x0:x1] for x0, y0, x1, y1 in rects], shape, keep_aspect=keep_aspect,
+                        padding=padding, out=out, scratch=scratch)
 
+
+@profiling.timed("utils.pad")
 def pad(image, shape, value=0):
     """
     Author: Samuel Westlake and Alix Leroy
@@ -116,6 +228,66 @@ def pad(image, shape, value=0):
     return padded
 
 
+@profiling.timed("utils.extract_crops")
+def extract_crops(img_paths, frames, rects, shape=None, keep_aspect=True, out=None, workers=4, verbose=0):
+    """
+    Crop many rects from frame images, grouping the crops by frame so that each frame is decoded once
+    Frames are processed concurrently by a thread pool and fixed-shape crops are written into one array in place
+    :param img_paths: list: path to the image of each frame
+    :param frames: np.array: frame index of each crop
+    :param rects: np.array: 2D array of rects (x1, y1, x2, y2) of each crop
+    :param shape: tuple: shape of the output crops (crops are not resized if None)
+    :param keep_aspect: bool: whether to keep the crop aspect ratio when resizing
+    :param out: np.array: array of shape (len(rects),) + shape to write the crops into (uint8, allocated if None)
+    :param workers: int: number of threads
+    :param verbose: int: whether to display a progress bar (over frames)
+    :return: np.array of crops if shape is given, else a list of crops (in the order of rects)
+    """
+    frames = np.asarray(frames, dtype=np.int64).reshape(-1)
+    rects = np.asarray(rects).reshape(-1, 4).astype(int)
+    rects[rects < 0] = 0
+    if shape is None:
+        crops = [None] * len(frames)
+    else:
+        crops = np.empty((len(frames),) + tuple(shape), dtype=np.uint8) if out is None else out
+    order = np.argsort(frames, kind="stable")
+    unique, starts = np.unique(frames[order], return_index=True)
+    groups = np.split(order, starts[1:])
+
+    def crop_frame(frame, rows):
+        image = imread(img_paths[frame])
+        scratch = None if shape is None or crops.dtype == image.dtype else np.empty(shape, dtype=image.dtype)
+        for row in rows:
+            x0, y0, x1, y1 = rects[row]
+            crop = image[y0:y1, x0:x1]
+            if shape is None:
+                crops[row] = crop.copy()
+            else:
+                resize_into(crop, crops[row], keep_aspect=keep_aspect, scratch=scratch)
+
+    progress_bar = Progbar(len(unique), width=30, verbose=verbose, interval=1) if verbose else None
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(crop_frame, frame, rows) for frame, rows in zip(unique, groups)]
+        for i, future in enumerate(as_completed(futures)):
+            future.result()
+            if progress_bar is not None:
+                progress_bar.update(i + 1)
+    return crops
+
+
+@functools.lru_cache(maxsize=None)
+def id2color(id_number):
+    """
+    Colors are drawn from a generator seeded with the id (the global NumPy random state is not touched)
+    and cached, so each id gets the same color every time at the cost of a dict lookup
+    :param id_number: int: an instance id
+    :return: tuple: the (b, g, r) color used to draw instances with this id, white for id -1
+    """
+    if id_number == -1:
+        return 255, 255, 255
+    return tuple(map(int, np.random.RandomState(id_number % 2 ** 32).randint(0, 255, 3)))
+
+
 def box2rect(box):
     """
     :param box: np.array: array of boxes (left, top, w, h) can be 1D or 2D
@@ -155,52 +327,122 @@ def box2xywh(box):
     return xywh.T
 
 
-def iou(rects):
+def iou(rects, chunk_size=None):
     """
     :param rects: np.array: 2D array of rects (x1, y1, x2, y2)
+    :param chunk_size: int: maximum number of rows computed at once (caps memory at chunk_size x n)
     :return: np.array: iou distances for each pair of rects
     """
-    n = rects.shape[0]
-    iou = np.empty((n, n))
-    for j in range(n):
-        for i in range(n):
-            x0 = max(rects[i, 0], rects[j, 0])
-            y0 = max(rects[i, 1], rects[j, 1])
-            x1 = min(rects[i, 2], rects[j, 2])
-            y1 = min(rects[i, 3], rects[j, 3])
-            if x0 < x1 and y0 < y1:
-                inter_area = (x1 - x0) * (y1 - y0)
-            else:
-                inter_area = 0
-            i_area = (rects[i, 2] - rects[i, 0]) * (rects[i, 3] - rects[i, 1])
-            j_area = (rects[j, 2] - rects[j, 0]) * (rects[j, 3] - rects[j, 1])
-            iou[j, i] = inter_area / (i_area + j_area - inter_area)
-    return iou
+    return iou2(rects, rects, chunk_size=chunk_size)
 
 
-def iou2(rects1, rects2):
+@profiling.timed("utils.iou2")
+def iou2(rects1, rects2, chunk_size=None, sparse=False):
     """
-    :param rects1:
-    :param rects2:
-    :return:
+    :param rects1: np.array: 2D array of rects (x1, y1, x2, y2)
+    :param rects2: np.array: 2D array of rects (x1, y1, x2, y2)
+    :param chunk_size: int: maximum number of rows of rects1 computed at once (caps memory at chunk_size x m)
+    :param sparse: bool: only compute the iou of pairs found to overlap by a SpatialIndex (the others are 0)
+    :return: np.array: iou of each pair of rects, shape (len(rects1), len(rects2))
     """
+    rects1 = np.asarray(rects1, dtype=np.float64).reshape(-1, 4)
+    rects2 = np.asarray(rects2, dtype=np.float64).reshape(-1, 4)
+    if sparse:
+        mat = np.zeros((len(rects1), len(rects2)))
+        i, j = overlap_pairs(rects1, rects2)
+        mat[i, j] = _iou(rects1[i], rects2[j])
+        return mat
     mat = np.empty((len(rects1), len(rects2)))
-    for j, r1 in enumerate(rects1):
-        for i, r2 in enumerate(rects2):
-            x0 = max(r2[0], r1[0])
-            y0 = max(r2[1], r1[1])
-            x1 = min(r2[2], r1[2])
-            y1 = min(r2[3], r1[3])
-            if x0 < x1 and y0 < y1:
-                inter_area = (x1 - x0) * (y1 - y0)
-            else:
-                inter_area = 0
-            i_area = (r2[2] - r2[0]) * (r2[3] - r2[1])
-            j_area = (r1[2] - r1[0]) * (r1[3] - r1[1])
-            mat[j, i] = inter_area / (i_area + j_area - inter_area)
+    step = len(rects1) if chunk_size is None else chunk_size
+    step = max(1, step)
+    for i in range(0, len(rects1), step):
+        r1 = rects1[i:i + step, None, :]
+        mat[i:i + step] = _iou(r1, rects2[None, :, :])
     return mat
 
 
+@profiling.timed("utils.batch_iou2")
+def batch_iou2(rects1, offsets1, rects2, offsets2, chunk_size=None, sparse=False):
+    """
+    Compute the iou matrix of every frame of two sequences in one call
+    Rects of frame f are rects[offsets[f]:offsets[f + 1]] (as held by a LabelStore)
+    :param rects1: np.array: 2D array of rects (x1, y1, x2, y2)
+    :param offsets1: np.array: per-frame offsets into rects1
+    :param rects2: np.array: 2D array of rects (x1, y1, x2, y2)
+    :param offsets2: np.array: per-frame offsets into rects2
+    :param chunk_size: int: maximum number of rect pairs computed at once (ignored if sparse)
+    :param sparse: bool: only compute the iou of pairs found to overlap by a SpatialIndex (the others are 0)
+    :return: list: iou matrix of each frame, shape (n1_f, n2_f), all views into one buffer
+    """
+    rects1 = np.asarray(rects1, dtype=np.float64).reshape(-1, 4)
+    rects2 = np.asarray(rects2, dtype=np.float64).reshape(-1, 4)
+    n_frames = min(len(offsets1), len(offsets2)) - 1
+    offsets1 = np.asarray(offsets1[:n_frames + 1], dtype=np.int64)
+    offsets2 = np.asarray(offsets2[:n_frames + 1], dtype=np.int64)
+    n1 = np.diff(offsets1)
+    n2 = np.diff(offsets2)
+    sizes = n1 * n2
+    starts = np.zeros(n_frames + 1, dtype=np.int64)
+    np.cumsum(sizes, out=starts[1:])
+    if sparse:
+        flat = np.zeros(starts[-1])
+        # Shift each frame along x so that rects of different frames never overlap, then sweep all frames at once
+        frame1 = np.repeat(np.arange(n_frames), n1)
+        frame2 = np.repeat(np.arange(n_frames), n2)
+        r1 = rects1[offsets1[0]:offsets1[-1]]
+        r2 = rects2[offsets2[0]:offsets2[-1]]
+        finite = np.concatenate((r1[np.isfinite(r1)], r2[np.isfinite(r2)]))
+        span = 2 * np.abs(finite).max(initial=0) + 1
+        shift1 = np.zeros_like(r1)
+        shift2 = np.zeros_like(r2)
+        shift1[:, [0, 2]] = (frame1 * span)[:, None]
+        shift2[:, [0, 2]] = (frame2 * span)[:, None]
+        i, j = overlap_pairs(r1 + shift1, r2 + shift2)
+        frame = frame1[i]
+        rows1 = i + offsets1[0]
+        rows2 = j + offsets2[0]
+        local = (rows1 - offsets1[frame]) * n2[frame] + rows2 - offsets2[frame]
+        flat[starts[frame] + local] = _iou(rects1[rows1], rects2[rows2])
+        return [flat[starts[f]:starts[f + 1]].reshape(n1[f], n2[f]) for f in range(n_frames)]
+    flat = np.empty(starts[-1])
+    step = len(flat) if chunk_size is None else chunk_size
+    step = max(1, step)
+    for p0 in range(0, len(flat), step):
+        pair = np.arange(p0, min(p0 + step, len(flat)))
+        frame = np.searchsorted(starts, pair, side="right") - 1
+        local = pair - starts[frame]
+        i = offsets1[frame] + local // n2[frame]
+        j = offsets2[frame] + local % n2[frame]
+        flat[pair] = _iou(rects1[i], rects2[j])
+    return [flat[starts[f]:starts[f + 1]].reshape(n1[f], n2[f]) for f in range(n_frames)]
+
+
+def overlap_pairs(rects1, rects2):
+    """
+    Pairs of rects that intersect, found with a SpatialIndex instead of testing every pair
+    :param rects1: np.array: 2D array of rects (x1, y1, x2, y2)
+    :param rects2: np.array: 2D array of rects (x1, y1, x2, y2)
+    :return: (np.array, np.array): indexes into rects1 and rects2 of each intersecting pair
+    """
+    return SpatialIndex(rects2).query_pairs(rects1)
+
+
+def _iou(rects1, rects2):
+    """
+    Element-wise iou of two broadcastable arrays of rects (x1, y1, x2, y2)
+    :param rects1: np.array: rects, last dimension of size 4
+    :param rects2: np.array: rects, last dimension of size 4
+    :return: np.array: iou of each (broadcast) pair, 0 where both rects have no area
+    """
+    w = np.minimum(rects1[..., 2], rects2[..., 2]) - np.maximum(rects1[..., 0], rects2[..., 0])
+    h = np.minimum(rects1[..., 3], rects2[..., 3]) - np.maximum(rects1[..., 1], rects2[..., 1])
+    inter_area = np.clip(w, 0, None) * np.clip(h, 0, None)
+    area1 = (rects1[..., 2] - rects1[..., 0]) * (rects1[..., 3] - rects1[..., 1])
+    area2 = (rects2[..., 2] - rects2[..., 0]) * (rects2[..., 3] - rects2[..., 1])
+    union = area1 + area2 - inter_area
+    return np.divide(inter_area, union, out=np.zeros(np.shape(union)), where=union > 0)
+
+
 def nms(array, by_row=True, by_col=True, threshold=0):
     """
     :param array:
@@ -210,19 +452,121 @@ def nms(array, by_row=True, by_col=True, threshold=0):
     :return:
     """
     # Apply row and column non maximum suppression
-    if by_row:
-        for index, row in enumerate(array):
-            row[row < np.max(row)] = 0
-            array[index, :] = row
-    if by_col:
-        for index, col in enumerate(array.T):
-            col[col < np.max(col)] = 0
-            array[:, index] = col
+    if by_row and array.size:
+        array[array < array.max(axis=1, keepdims=True)] = 0
+    if by_col and array.size:
+        array[array < array.max(axis=0, keepdims=True)] = 0
     if threshold:
         array[array < threshold] = 0
     return array
 
 
+@profiling.timed("utils.linear_assignment")
+def linear_assignment(cost):
+    """
+    Minimum cost assignment of rows to columns (Hungarian algorithm, shortest augmenting path form)
+    Every row is assigned if there are at least as many columns as rows, and vice versa
+    :param cost: np.array: 2D array of finite costs
+    :return: (np.array, np.array): assigned row indexes (sorted) and the corresponding column indexes
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # 1-based potentials and assignment, column 0 is a virtual column used during augmentation
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)                                 # p[j]: row assigned to column j
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            free = ~used[1:]
+            reduced = cost[p[j0] - 1] - u[p[j0]] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.flatnonzero(p[1:]).astype(np.int64)
+    rows = p[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+@profiling.timed("utils.greedy_assignment")
+def greedy_assignment(array, threshold=0):
+    """
+    Greedily match the rows and columns of a similarity matrix, highest similarity first
+    Each round matches every pair that is the maximum of both its row and its column
+    :param array: np.array: 2D similarity matrix (e.g. iou)
+    :param threshold: float: pairs with a similarity below threshold (or of zero) are not matched
+    :return: (np.array, np.array): matched row indexes (sorted) and the corresponding column indexes
+    """
+    array = np.array(array, dtype=np.float64)
+    array[(array < threshold) | (array <= 0)] = -np.inf
+    rows, cols = [], []
+    while array.size:
+        row_best = np.argmax(array, axis=1)
+        col_best = np.argmax(array, axis=0)
+        r = np.flatnonzero((col_best[row_best] == np.arange(len(array))) &
+                           (array[np.arange(len(array)), row_best] > -np.inf))
+        if not r.size:
+            break
+        c = row_best[r]
+        rows.append(r)
+        cols.append(c)
+        array[r, :] = -np.inf
+        array[:, c] = -np.inf
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+@profiling.timed("utils.match")
+def match(array, threshold=0.5, method="hungarian"):
+    """
+    Match the rows and columns of a similarity matrix (e.g. iou), gating out pairs below threshold
+    :param array: np.array: 2D similarity matrix
+    :param threshold: float: pairs with a similarity below threshold (or of zero) are not matched
+    :param method: str: 'hungarian' (maximum total similarity) or 'greedy' (highest similarity first)
+    :return: (np.array, np.array): matched row indexes and the corresponding column indexes
+    """
+    if method == "hungarian":
+        array = np.asarray(array, dtype=np.float64)
+        gated = np.where((array >= threshold) & (array > 0), array, 0)
+        rows, cols = linear_assignment(-gated)
+        keep = gated[rows, cols] > 0
+        return rows[keep], cols[keep]
+    elif method == "greedy":
+        return greedy_assignment(array, threshold=threshold)
+    else:
+        raise ValueError("unknown matching method %s" % method)
+
+
 class Progbar(object):
     """Displays a progress bar.
 
@@ -381,3 +725,95 @@ class Progbar(object):
 
     def add(self, n, values=None):
         self.update(self._seen_so_far + n, values)
+
+
+class ImageCache(object):
+    """Size-bounded LRU cache of decoded images, shared by Frame and Instance through imread().
+
+    Cached images are read-only, copy them before drawing on them.
+
+    # Arguments
+        max_bytes: Maximum total size of the decoded images held in the cache.
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._images = collections.OrderedDict()
+        self._n_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Returns the decoded image at path, decoding it on a cache miss.
+
+        # Arguments
+            path: Path to the image file.
+        """
+        with self._lock:
+            image = self._images.get(path)
+            if image is not None:
+                self._images.move_to_end(path)
+                self.hits += 1
+        if image is not None:
+            profiling.count("image_cache.hits")
+            return image
+        with self._lock:
+            self.misses += 1
+        profiling.count("image_cache.misses")
+        start_time = profiling.start()
+        image = cv2.imread(path)
+        profiling.stop("cv2.imread", start_time)
+        if image is None:
+            raise FileNotFoundError("cv2.imread(%s) returned None, check %s" % (path, path))
+        image.flags.writeable = False
+        if image.nbytes <= self.max_bytes:
+            with self._lock:
+                if path not in self._images:
+                    self._images[path] = image
+                    self._n_bytes += image.nbytes
+                self._evict()
+        return image
+
+    def resize(self, max_bytes):
+        """Changes the maximum size of the cache, evicting images if needed.
+
+        # Arguments
+            max_bytes: Maximum total size of the decoded images held in the cache.
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """Removes every image from the cache and resets the counters."""
+        with self._lock:
+            self._images.clear()
+            self._n_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """Returns a dict of the cache hits, misses, number of images and bytes held."""
+        with self._lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "images": len(self._images),
+                    "bytes": self._n_bytes}
+
+    def _evict(self):
+        while self._n_bytes > self.max_bytes:
+            _, image = self._images.popitem(last=False)
+            self._n_bytes -= image.nbytes
+
+
+# Decoded image cache shared by Frame and Instance
+image_cache = ImageCache()
+
+
+def imread(path):
+    """
+    :param path: str: path to an image file
+    :return: np.array: the decoded (read-only) image, from the shared image cache
+    """
+    return image_cache.get(path)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import unittest
+
+import numpy as np
+
+from pymoth import Sequence
+from pymoth import metrics
+
+# Two gt targets over three frames, with hand-computed scores:
+# frame 1: gt 1 hyp 10 (shifted by one pixel, iou 9 / 11), gt 2 hyp 11
+# frame 2: gt 1 hyp 10, gt 2 hyp 12 (identity switch)
+# frame 3: gt 1 hyp 10, gt 2 missed, hyp 11 false positive
+gt_lines = ["1,1,0,0,10,10,1,1,1",
+            "1,2,100,0,10,10,1,1,1",
+            "2,1,0,0,10,10,1,1,1",
+            "2,2,100,0,10,10,1,1,1",
+            "3,1,0,0,10,10,1,1,1",
+            "3,2,100,0,10,10,1,1,1"]
+hyp_lines = ["1,10,1,0,10,10,1",
+             "1,11,100,0,10,10,1",
+             "2,10,0,0,10,10,1",
+             "2,12,100,0,10,10,1",
+             "3,10,0,0,10,10,1",
+             "3,11,300,0,10,10,1"]
+
+
+def make_sequence(lines, file_format):
+    sequence = Sequence(file_format=file_format)
+    sequence.add_labels(sequence.label_format.parse(lines))
+    return sequence
+
+
+class TestClearMot(unittest.TestCase):
+
+    def setUp(self):
+        self.gt = make_sequence(gt_lines, "MOT-gt")
+        self.hyp = make_sequence(hyp_lines, "MOT")
+
+    def test_counts(self):
+        result = metrics.clear_mot(self.gt, self.hyp)
+        expected = {"gt": 6, "hyp": 6, "matches": 5, "FP": 1, "FN": 1, "IDSW": 1, "MT": 1, "PT": 1, "ML": 0,
+                    "Frag": 0, "gt_ids": 2}
+        self.assertEqual({key: result[key] for key in expected}, expected)
+
+    def test_scores(self):
+        result = metrics.clear_mot(self.gt, self.hyp)
+        self.assertAlmostEqual(result["MOTA"], 1 - 3 / 6)
+        self.assertAlmostEqual(result["MOTP"], (4 + 9 / 11) / 5)
+        self.assertAlmostEqual(result["Recall"], 5 / 6)
+        self.assertAlmostEqual(result["Precision"], 5 / 6)
+
+    def test_mostly_tracked_is_strict(self):
+        # gt 1 is tracked in 4 of 5 frames (exactly 80%): partially, not mostly, tracked
+        gt = make_sequence(["%i,1,0,0,10,10,1,1,1" % f for f in range(1, 6)], "MOT-gt")
+        hyp = make_sequence(["%i,10,0,0,10,10,1" % f for f in range(1, 5)], "MOT")
+        result = metrics.clear_mot(gt, hyp)
+        self.assertEqual((result["MT"], result["PT"], result["ML"]), (0, 1, 0))
+
+    def test_distractors(self):
+        gt = make_sequence(["1,1,0,0,10,10,1,1,1",
+                            "1,2,100,0,10,10,0,7,1",                    # Static person
+                            "1,3,200,0,10,10,1,3,1",                    # Car, not a distractor
+                            "1,4,300,0,10,10,0,1,1"], "MOT-gt")         # Zero-marked pedestrian
+        hyp = make_sequence(["1,10,0,0,10,10,1",
+                             "1,11,101,0,10,10,1",
+                             "1,12,200,0,10,10,1",
+                             "1,13,300,0,10,10,1",
+                             "1,14,500,0,10,10,1"], "MOT")
+        result = metrics.clear_mot(gt, hyp)
+        # Hyps 11 and 13 are removed, 12 and 14 are false positives
+        self.assertEqual((result["gt"], result["hyp"], result["matches"], result["FP"]), (1, 3, 1, 2))
+        # Without the class column only the conf 0 gt instances are ignored
+        gt = make_sequence([line.rsplit(",", 2)[0] for line in ["1,1,0,0,10,10,1,1,1", "1,2,100,0,10,10,0,7,1"]],
+                           "MOT")
+        result = metrics.clear_mot(gt, hyp)
+        self.assertEqual((result["gt"], result["hyp"], result["FP"]), (1, 5, 4))
+
+
+class TestIdentity(unittest.TestCase):
+
+    def setUp(self):
+        self.gt = make_sequence(gt_lines, "MOT-gt")
+        self.hyp = make_sequence(hyp_lines, "MOT")
+
+    def test_idf1(self):
+        result = metrics.idf1(self.gt, self.hyp)
+        # gt 1 is matched to hyp 10 (3 frames), gt 2 to hyp 11 or 12 (1 frame)
+        self.assertEqual((result["IDTP"], result["IDFP"], result["IDFN"]), (4, 2, 2))
+        self.assertAlmostEqual(result["IDF1"], 2 / 3)
+        self.assertAlmostEqual(result["IDP"], 2 / 3)
+        self.assertAlmostEqual(result["IDR"], 2 / 3)
+
+    def test_hota(self):
+        result = metrics.hota(self.gt, self.hyp)
+        # Up to alpha 0.8 the shifted box (iou 9 / 11) is a match: 5 TP, 1 FN, 1 FP
+        # Association of each TP: (gt 1, hyp 10) 3 / (3 + 3 - 3), (gt 2, hyp 11) 1 / (3 + 2 - 1), (gt 2, hyp 12) 1 / 3
+        low = np.sqrt(5 / 7 * (3 + 1 / 4 + 1 / 3) / 5)
+        # From alpha 0.85 it is not: 4 TP, 2 FN, 2 FP, and (gt 1, hyp 10) matches twice, 2 / (3 + 3 - 2)
+        high = np.sqrt(4 / 8 * (2 * 2 / 4 + 1 / 4 + 1 / 3) / 4)
+        self.assertEqual(len(metrics.hota_alphas), 19)
+        np.testing.assert_allclose(result["HOTA_alpha"], [low] * 16 + [high] * 3)
+        self.assertAlmostEqual(result["HOTA"], (16 * low + 3 * high) / 19)
+        self.assertAlmostEqual(result["DetA"], (16 * 5 / 7 + 3 * 4 / 8) / 19)
+        self.assertAlmostEqual(result["DetRe"], (16 * 5 / 6 + 3 * 4 / 6) / 19)
+        self.assertAlmostEqual(result["LocA"], (16 * (4 + 9 / 11) / 5 + 3) / 19)
+
+    def test_evaluate_and_combine(self):
+        result = metrics.evaluate(self.gt, self.hyp)
+        for key, value in metrics.idf1(self.gt, self.hyp).items():
+            self.assertAlmostEqual(result[key], value)
+        self.assertAlmostEqual(result["HOTA"], metrics.hota(self.gt, self.hyp)["HOTA"])
+        # Two identical sequences combine to the same scores
+        combined = metrics.combine([result, result])
+        for key in ("MOTA", "MOTP", "IDF1", "HOTA", "DetA", "AssA", "LocA"):
+            self.assertAlmostEqual(combined[key], result[key])
+        self.assertEqual(combined["IDSW"], 2 * result["IDSW"])
+
+
+if __name__ == "__main__":
+    unittest.main()
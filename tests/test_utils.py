@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import itertools
+import unittest
+
+import numpy as np
+
+from pymoth.utils import greedy_assignment
+from pymoth.utils import linear_assignment
+from pymoth.utils import match
+
+
+def brute_force_assignment(cost):
+    """
+    :return: float: the minimum total cost of assigning min(n, m) rows to distinct columns, by enumeration
+    """
+    n, m = cost.shape
+    if n <= m:
+        return min(cost[range(n), list(cols)].sum() for cols in itertools.permutations(range(m), n))
+    return min(cost[list(rows), range(m)].sum() for rows in itertools.permutations(range(n), m))
+
+
+class TestLinearAssignment(unittest.TestCase):
+
+    def test_brute_force(self):
+        rng = np.random.RandomState(0)
+        for _ in range(300):
+            n, m = rng.randint(1, 7, size=2)
+            cost = rng.uniform(-1, 1, (n, m))
+            if rng.rand() < 0.3:
+                cost = np.round(cost * 3)                               # Ties
+            rows, cols = linear_assignment(cost)
+            self.assertEqual(len(rows), min(n, m))
+            self.assertEqual(len(set(rows.tolist())), len(rows))
+            self.assertEqual(len(set(cols.tolist())), len(cols))
+            self.assertTrue(np.all(np.diff(rows) > 0))
+            self.assertAlmostEqual(cost[rows, cols].sum(), brute_force_assignment(cost))
+
+    def test_empty(self):
+        for shape in ((0, 0), (0, 3), (3, 0)):
+            rows, cols = linear_assignment(np.zeros(shape))
+            self.assertEqual(len(rows), 0)
+            self.assertEqual(len(cols), 0)
+
+
+class TestMatch(unittest.TestCase):
+
+    def test_hungarian_gate(self):
+        iou = np.array([[0.9, 0.6, 0.0],
+                        [0.7, 0.0, 0.0],
+                        [0.0, 0.0, 0.4]])
+        rows, cols = match(iou, threshold=0.5, method="hungarian")
+        # Maximum total iou: 0.6 + 0.7 beats 0.9 alone, the 0.4 pair is gated out
+        self.assertEqual(rows.tolist(), [0, 1])
+        self.assertEqual(cols.tolist(), [1, 0])
+
+    def test_greedy(self):
+        iou = np.array([[0.9, 0.6, 0.0],
+                        [0.7, 0.0, 0.0],
+                        [0.0, 0.0, 0.4]])
+        rows, cols = greedy_assignment(iou, threshold=0.5)
+        self.assertEqual(sorted(zip(rows.tolist(), cols.tolist())), [(0, 0)])
+
+
+if __name__ == "__main__":
+    unittest.main()